@@ -0,0 +1,374 @@
+#!/usr/bin/python
+#
+# benchmark.py
+#
+# Times (& measures the peak memory of) each phase of slopegraph.py --
+# readCSV, groupLabels, sortKeys, findExtremes, calculateExtents &
+# makeSlopegraph for every output format -- on synthetic data sets from
+# 10 to 1M rows, writes the results as JSON & compares them against a
+# saved baseline run so regressions stand out
+#
+#   ./benchmark.py --output new.json --baseline old.json
+#
+# Peak memory ("py peak") comes from tracemalloc, which only sees Python
+# heap allocations: cairo's surfaces & PDF/PNG buffers are allocated in C
+# and don't show up. --rss also runs every case in child processes (one
+# for the prep phases, one per output format) & reports each child's peak
+# resident size, which does count them. --font-metrics python measures
+# text without cairo (for hosts that don't have it)
+#
+# Workloads:
+#
+#   uniform      - spread out values, one label per row
+#   ties         - only 20 distinct values, so labels pile up in groups
+#   near-dup     - values a hair apart (the minimum-delta trap: tiny
+#                  deltas blow the "delta" height way up)
+#   log          - values over nine orders of magnitude, log_scale on
+#   long-labels  - 200+ character labels (text measuring & width)
+#
+########################################################################
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+try:
+	import resource
+except ImportError:
+	resource = None # no --rss (Windows)
+
+import slopegraph
+
+if hasattr(time, "perf_counter"):
+	clock = time.perf_counter
+else:
+	clock = time.time
+
+SIZES = [ 10, 100, 1000, 10000, 100000, 1000000 ]
+FORMATS = [ "pdf", "ps", "svg", "png", "js", "pde", "layout" ]
+
+BASE_CONFIG = {
+	"label_font_family" : "Helvetica",
+	"label_font_size" : "10",
+	"header_font_family" : "Helvetica",
+	"header_font_size" : "12",
+	"x_margin" : "20",
+	"y_margin" : "30",
+	"line_width" : "0.5",
+	"slope_length" : "200",
+	"labels" : [ "Before", "After" ],
+	"header_color" : "000000",
+	"background_color" : "FFFFFF",
+	"label_color" : "111111",
+	"value_color" : "999999",
+	"slope_color" : "AAAAAA",
+	"slope_up_color" : "FF0000",
+	"slope_down_color" : "0000FF",
+	"value_format_string" : "%d",
+}
+
+# each workload: (row generator, config overrides)
+
+def uniformRows(rng, n):
+	for i in range(n):
+		beg = rng.randint(0, 1000000)
+		yield ("L%07d" % i, beg, beg + rng.randint(-100000, 100000))
+
+def tiedRows(rng, n):
+	for i in range(n):
+		yield ("L%07d" % i, rng.randint(1, 20) * 100, rng.randint(1, 20) * 100)
+
+def nearDupRows(rng, n):
+	for i in range(n):
+		yield ("L%07d" % i, 1000 + rng.random() * 0.001, 1000 + rng.random() * 0.001)
+
+def logRows(rng, n):
+	for i in range(n):
+		yield ("L%07d" % i, 10 ** rng.uniform(0, 9), 10 ** rng.uniform(0, 9))
+
+def longLabelRows(rng, n):
+	for i in range(n):
+		beg = rng.randint(0, 1000000)
+		yield ("%07d %s" % (i, "Lorem ipsum dolor sit amet " * 8), beg, beg + rng.randint(-100000, 100000))
+
+WORKLOADS = [
+	("uniform", uniformRows, {}),
+	("ties", tiedRows, {}),
+	("near-dup", nearDupRows, { "value_format_string" : "%.6f" }),
+	("log", logRows, { "log_scale" : "1" }),
+	("long-labels", longLabelRows, {}),
+]
+
+def writeCSV(filename, rows):
+	
+	f = open(filename, "w")
+	try:
+		for row in rows:
+			f.write("%s,%r,%r\n" % row)
+	finally:
+		f.close()
+
+def phases(sg, config, csvFile, outDir, formats):
+	
+	# (name, callable) for every phase of a render, in order
+	
+	steps = [
+		("readCSV", lambda: sg.readCSV(csvFile)),
+		("groupLabels", sg.groupLabels),
+		("sortKeys", sg.sortKeys),
+		("findExtremes", sg.findExtremes),
+		("calculateExtents", sg.calculateExtents),
+	]
+	
+	for fmt in formats:
+		steps.append(("makeSlopegraph:" + fmt,
+			lambda fmt=fmt: sg.makeSlopegraph(os.path.join(outDir, "bench." + fmt), dict(config, format=fmt))))
+	
+	return(steps)
+
+def runPhases(config, csvFile, outDir, formats, traced):
+	
+	# one full pass with a fresh (cold) renderer; returns { phase : value }
+	# (seconds, or peak bytes allocated during the phase when "traced").
+	# a phase that raises records the error; the rest of the prep phases are
+	# skipped but every output format still gets its own try
+	
+	sg = slopegraph.PySlopegraph(metrics=slopegraph.TextMetrics())
+	sg.configure(config)
+	sg.reset()
+	
+	results = {}
+	broken = None
+	
+	for name, step in phases(sg, config, csvFile, outDir, formats):
+		
+		if broken is not None:
+			results[name] = { "error" : broken }
+			continue
+		
+		try:
+			if traced:
+				tracemalloc.start()
+				step()
+				results[name] = tracemalloc.get_traced_memory()[1]
+				tracemalloc.stop()
+			else:
+				start = clock()
+				step()
+				results[name] = clock() - start
+		except Exception as e:
+			if traced:
+				tracemalloc.stop()
+			results[name] = { "error" : "%s: %s" % (e.__class__.__name__, e) }
+			if not name.startswith("makeSlopegraph"):
+				broken = "skipped (%s failed)" % (name)
+	
+	return(results)
+
+def runCase(case):
+	
+	# child side of --rss: one untimed pass of a case
+	
+	case = json.loads(case)
+	runPhases(case["config"], case["csv"], case["out"], case["formats"], False)
+	
+	return(0)
+
+def peakRSS(config, csvFile, outDir, formats):
+	
+	# peak resident size (bytes) of a fresh process running the prep phases
+	# & "formats"; it includes the interpreter itself but, unlike
+	# tracemalloc, also everything cairo allocates in C
+	
+	case = json.dumps({ "config" : config, "csv" : csvFile, "out" : outDir, "formats" : formats })
+	devnull = open(os.devnull, "w")
+	try:
+		child = subprocess.Popen([ sys.executable, os.path.abspath(__file__), "--run-case", case ], stdout=devnull)
+		pid, status, usage = os.wait4(child.pid, 0)
+		child.returncode = status
+	finally:
+		devnull.close()
+	
+	if status != 0:
+		return(None)
+	
+	if (sys.platform == "darwin"):
+		return(usage.ru_maxrss) # bytes there, KB everywhere else
+	
+	return(usage.ru_maxrss * 1024)
+
+def benchmark(sizes, workloads, formats, repeat, seed, fontMetrics="cairo", rss=False):
+	
+	results = {}
+	tmpDir = tempfile.mkdtemp(prefix="slopegraph-bench-")
+	
+	try:
+		for workload, rowGen, overrides in WORKLOADS:
+			
+			if workload not in workloads:
+				continue
+			
+			config = dict(BASE_CONFIG, font_metrics=fontMetrics, **overrides)
+			
+			for n in sizes:
+				
+				csvFile = os.path.join(tmpDir, "bench.csv")
+				writeCSV(csvFile, rowGen(random.Random(seed), n))
+				
+				# best of "repeat" timed passes, then one traced pass for
+				# memory (tracemalloc slows everything down too much to time)
+				
+				timings = [ runPhases(config, csvFile, tmpDir, formats, False) for i in range(repeat) ]
+				peaks = {}
+				if tracemalloc is not None:
+					peaks = runPhases(config, csvFile, tmpDir, formats, True)
+				
+				# with --rss: the prep phases' peak (shown on calculateExtents)
+				# & the peak of prep + each format
+				
+				rssPeaks = {}
+				if rss:
+					rssPeaks["calculateExtents"] = peakRSS(config, csvFile, tmpDir, [])
+					for fmt in formats:
+						rssPeaks["makeSlopegraph:" + fmt] = peakRSS(config, csvFile, tmpDir, [ fmt ])
+				
+				for name in timings[0]:
+					key = "%s/%d/%s" % (workload, n, name)
+					if isinstance(timings[0][name], dict):
+						results[key] = timings[0][name]
+					else:
+						results[key] = { "seconds" : min([ t[name] for t in timings ]),
+										"peak_bytes" : peaks.get(name) if not isinstance(peaks.get(name), dict) else None,
+										"rss_bytes" : rssPeaks.get(name) }
+					report(key, results[key])
+	finally:
+		shutil.rmtree(tmpDir, True)
+	
+	return(results)
+
+def report(key, result):
+	
+	if "error" in result:
+		print("%-48s %s" % (key, result["error"]))
+		return
+	
+	line = "%-48s %10.4fs" % (key, result["seconds"])
+	if result["peak_bytes"] is not None:
+		line += " %10.1fKB" % (result["peak_bytes"] / 1024.0)
+	if result.get("rss_bytes") is not None:
+		line += " %10.1fMB" % (result["rss_bytes"] / 1048576.0)
+	
+	print(line)
+
+def compare(results, baseline, threshold, minSeconds):
+	
+	# phases that got more than "threshold" times slower (or hungrier) than
+	# the baseline; phases faster than "minSeconds" in both are timer noise
+	
+	regressions = []
+	
+	for key in sorted(results):
+		
+		new = results[key]
+		old = baseline.get(key)
+		if (old is None) or ("error" in new) or ("error" in old):
+			continue
+		
+		if max(new["seconds"], old["seconds"]) >= minSeconds and (new["seconds"] > old["seconds"] * threshold):
+			regressions.append("%-48s time %.4fs -> %.4fs (x%.2f)" % (key, old["seconds"], new["seconds"], new["seconds"] / max(old["seconds"], 1e-9)))
+		
+		if new.get("peak_bytes") and old.get("peak_bytes") and (new["peak_bytes"] > old["peak_bytes"] * threshold):
+			regressions.append("%-48s peak %dB -> %dB (x%.2f)" % (key, old["peak_bytes"], new["peak_bytes"], float(new["peak_bytes"]) / old["peak_bytes"]))
+		
+		if new.get("rss_bytes") and old.get("rss_bytes") and (new["rss_bytes"] > old["rss_bytes"] * threshold):
+			regressions.append("%-48s rss %dB -> %dB (x%.2f)" % (key, old["rss_bytes"], new["rss_bytes"], float(new["rss_bytes"]) / old["rss_bytes"]))
+	
+	return(regressions)
+
+def main():
+	
+	parser = argparse.ArgumentParser(description="Benchmark slopegraph.py on synthetic data")
+	parser.add_argument("--sizes", default=",".join([ str(n) for n in SIZES ]),
+					help="comma separated row counts (default: %(default)s)",)
+	parser.add_argument("--workloads", default=",".join([ w[0] for w in WORKLOADS ]),
+					help="comma separated workloads (default: %(default)s)",)
+	parser.add_argument("--formats", default=",".join(FORMATS),
+					help="comma separated output formats (default: %(default)s)",)
+	parser.add_argument("--repeat", type=int, default=1,
+					help="timed passes per case; the best one is kept",)
+	parser.add_argument("--seed", type=int, default=2012,
+					help="random seed for the synthetic data",)
+	parser.add_argument("--output", metavar="FILE",
+					help="write the results to FILE as JSON",)
+	parser.add_argument("--baseline", metavar="FILE",
+					help="compare against the results saved in FILE; exits 1 on regressions",)
+	parser.add_argument("--threshold", type=float, default=1.25,
+					help="slowdown/growth ratio counted as a regression (default: %(default)s)",)
+	parser.add_argument("--min-seconds", type=float, default=0.01,
+					help="ignore timing changes in phases faster than this (default: %(default)s)",)
+	parser.add_argument("--font-metrics", choices=[ "cairo", "python" ], default="cairo",
+					help="measure text with cairo or with built-in metrics (no cairo needed) (default: %(default)s)",)
+	parser.add_argument("--rss", action="store_true",
+					help="also report each phase's peak resident size, measured in child processes; unlike the "
+						"tracemalloc peak it includes cairo's C allocations",)
+	parser.add_argument("--run-case", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	
+	if args.run_case:
+		return(runCase(args.run_case))
+	
+	if args.rss and (resource is None):
+		parser.error("--rss needs the resource module (not on this platform)")
+	
+	sizes = [ int(n) for n in args.sizes.split(",") ]
+	workloads = args.workloads.split(",")
+	formats = args.formats.split(",")
+	
+	print("%-48s %11s %12s%s" % ("phase", "seconds", "py peak", args.rss and " %12s" % ("rss peak") or ""))
+	
+	results = benchmark(sizes, workloads, formats, max(1, args.repeat), args.seed, args.font_metrics, args.rss)
+	
+	if args.output:
+		f = open(args.output, "w")
+		try:
+			json.dump({ "version" : slopegraph.__version__,
+						"python" : platform.python_version(),
+						"cairo" : getattr(slopegraph.cairo, "cairo_version_string", lambda: None)(), # None if never loaded
+						"results" : results }, f, sort_keys=True, indent=1)
+		finally:
+			f.close()
+	
+	if args.baseline:
+		
+		f = open(args.baseline)
+		try:
+			baseline = json.load(f)
+		finally:
+			f.close()
+		
+		regressions = compare(results, baseline["results"], args.threshold, args.min_seconds)
+		
+		if regressions:
+			print("\n%d regression(s) against %s (version %s):" % (len(regressions), args.baseline, baseline.get("version")))
+			for line in regressions:
+				print(line)
+			return(1)
+		
+		print("\nno regressions against %s (version %s)" % (args.baseline, baseline.get("version")))
+	
+	return(0)
+
+if __name__ == "__main__":
+	sys.exit(main())
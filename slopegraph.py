@@ -95,656 +95,3490 @@
 # 2012-06-12 - 0.9.6 - More Raphael namespace cleanup + some experimental
 #                      animation support.
 #
+# 2026-10-16 - 0.9.7 - New "--batch" mode which takes a list (or glob) of
+#                      config files and renders them across a pool of
+#                      worker processes ("--workers" sets the pool size).
+#                      Failures are reported per config & the exit status
+#                      is non-zero if any of them failed.
+#
+# 2026-10-16 - 0.9.8 - PySlopegraph can now be kept around & reused:
+#                      construction is separate from rendering ("render()"
+#                      / "renderJobs()"), per-chart state is per instance
+#                      and "reset()" clears it; rows can be passed in
+#                      directly instead of read from "input"
+#
+# 2026-10-16 - 0.9.9 - Text measurements go through an LRU cache keyed by
+#                      font family/size/weight & string; "metrics_cache"
+#                      (or "--metrics-cache") names a JSON file so the cache
+#                      can be shared between runs & batch workers
+#
+# 2026-10-16 - 0.9.10 - Text is measured on a small in-memory context (with
+#                      metric hinting off so every format measures the same)
+#                      instead of a throwaway surface on the output file, so
+#                      each chart writes its output exactly once
+#
+# 2026-10-16 - 0.9.11 - New layout stage ("computeLayout") works out every
+#                      label/value/line coordinate once; the cairo, Raphael
+#                      & Processing ("pde", which now actually writes its
+#                      sketch) backends just read from that table
+#
+# 2026-10-16 - 0.9.12 - Chart height no longer comes from the smallest gap
+#                      between two values (which could get enormous). The
+#                      value scale is proportional over a plot area sized by
+#                      the # of labels (at most two lines per label unless
+#                      "target_height" says otherwise) & colliding labels
+#                      are nudged apart in one sorted sweep.
+#                      "label_placement" : "delta" brings back the old sizing
+#
+# 2026-10-16 - 0.9.13 - CSV input is streamed: "header" (true/false/"auto"),
+#                      "columns" (label, start & end column by name or
+#                      position), "include_labels" (allow-list) and "top_n"
+#                      / "top_by" ("abs_change", "rel_change", "start" or
+#                      "end") are applied as rows are read, so memory
+#                      depends on N rather than the size of the file
+#
+# 2026-10-16 - 0.9.14 - Labels sharing a value are kept as lists & joined
+#                      once; "label_group_limit" caps how many are shown
+#                      (e.g. "A; B; C (+412 more)")
+#
+# 2026-10-16 - 0.10.0 - Arbitrary # of periods (finally!). Values are kept
+#                      column-wise (one array per period + the labels) and
+#                      each row is drawn as one polyline across the columns;
+#                      labels sit on the outer columns & the inner ones just
+#                      show values. The # of periods comes from "periods",
+#                      "columns" or "labels" (in that order), default 2
+#
+# 2026-10-16 - 0.10.1 - The Raphael ("js") output is now a compact JSON data
+#                      block plus one small fixed loop that creates the
+#                      elements & animations, written out as it's generated
+#                      (instead of one hand-built statement per element)
+#
+# 2026-10-16 - 0.10.2 - cairo output strokes one compound path per slope
+#                      colour (up/down/flat) & sets each text colour once,
+#                      instead of a colour change + stroke for every row
+#
+# 2026-10-16 - 0.10.3 - New "--serve [HOST:]PORT" mode: a small local HTTP
+#                      render service (POST /render with a config & inline
+#                      CSV, get the chart bytes back) with a pool of warm
+#                      renderers & an LRU cache of rendered output keyed by
+#                      a hash of the config + data. render() can now write
+#                      to a file object & read "input" from one
+#
+# 2026-10-16 - 0.10.4 - New "--manifest FILE" option records a hash of each
+#                      config, its CSV & the renderer version (__version__)
+#                      so configs that haven't changed since the last run
+#                      are skipped. PDF & PS get a fixed creation date (from
+#                      SOURCE_DATE_EPOCH if set) so identical inputs give
+#                      byte-identical output. "make" uses a manifest
+#
+# 2026-10-16 - 0.10.5 - Opt-in instrumentation: "--stats [FILE]" writes each
+#                      chart's per-phase timings, counters (rows, unique
+#                      start/end keys, text_extents calls, strokes, output
+#                      bytes...) & canvas size as JSON lines; library users
+#                      get the same dict via PySlopegraph(statsHook=...)
+#
+# 2026-10-16 - 0.10.6 - "format" can be a list (e.g. [ "pdf", "png", "svg" ])
+#                      to get every format from one read/sort/measure/layout
+#                      pass; cairo formats replay a single recorded drawing
+#
+# 2026-10-16 - 0.10.7 - Small multiples: "facet_by" (a column) splits the CSV
+#                      in one scan & renders a slopegraph per facet, either
+#                      as separate "<output>-<facet>" files or ("facet_layout"
+#                      : "grid", "facet_columns") tiled on one page. Facets
+#                      render in parallel ("facet_workers") & can share one
+#                      value scale ("facet_scales" : "shared")
+#
+# 2026-10-16 - 0.10.8 - PNG output can be scaled with "dpi" & rasterized in
+#                      bands ("png_band_height", automatic for charts too
+#                      tall for a single cairo surface) that are streamed
+#                      straight into the PNG, so memory use depends on the
+#                      band, not the whole image
+#
+# 2026-10-16 - 0.10.9 - New "layout" format writes the computed geometry as
+#                      JSON. cairo is now imported lazily (only to measure
+#                      or draw with it) & "font_metrics" : "python" measures
+#                      text from TTF/OTF/AFM advance widths ("font_files")
+#                      or built-in Helvetica widths, so "layout" (which
+#                      defaults to it) runs without cairo installed
+#
+# 2026-10-16 - 0.11.0 - "--watch" (with --config) follows the input CSV: only
+#                      newly appended rows are parsed (onto those already
+#                      read), bursts of writes are debounced ("--debounce")
+#                      & the chart is only re-written when its layout changed
+#
+# 2026-10-16 - 0.11.1 - Incremental updates for live charts: addRow(),
+#                      updateRow() & removeRow() keep the sorted keys, label
+#                      groups, extremes & smallest gap current per change
+#                      (no full re-sort); refresh() re-renders
+#
+# 2026-10-16 - 0.11.2 - Optional numpy path ("vectorize"): big inputs are
+#                      parsed, rounded & grouped as whole arrays & the keys
+#                      sorted/differenced with numpy; charts are identical
+#                      to (and it falls back on) the pure-python path
+#
+# 2026-10-16 - 0.11.3 - Values & labels are formatted & measured once, into a
+#                      table both the sizing & drawing passes read; digit
+#                      grouping is no longer recursive, keeps the "$" & last
+#                      digit of decimals and can follow a "number_locale"
+#
+# 2026-10-16 - 0.11.4 - Level of detail ("detail_rows"): past that many rows
+#                      only the top ones ("detail_by") are drawn & labelled,
+#                      labels that don't fit are dropped & the rest of the
+#                      rows become translucent start bin x end bin bands
+#
+# 2026-10-16 - 0.11.5 - "input" : "-" reads the CSV from stdin (header
+#                      sniffing no longer seeks) & "output" : "-" writes the
+#                      chart to stdout; renderBytes() renders CSV text/bytes
+#                      to bytes in memory
+#
 
 import csv
-import cairo
 import argparse
+import array
+import bisect
+import collections
+import glob
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import locale
 import math
+import multiprocessing
+import operator
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	import queue
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	import Queue as queue
+
+__version__ = "0.11.5"
+
+# phase timer for --stats
+
+if hasattr(time, "perf_counter"):
+	clock = time.perf_counter
+else:
+	clock = time.time
+
+# cairo is only imported (by loadCairo()) once something is actually drawn or
+# measured with it, so "layout" output (with "python" font metrics) runs
+# without it. font weights use cairo's values
+
+cairo = None
+
+try:
+	unichr
+except NameError:
+	unichr = chr
+
+FONT_WEIGHT_NORMAL = 0
+FONT_WEIGHT_BOLD = 1
 
+# cairo can't make image surfaces taller/wider than this (pixels)
+
+MAX_IMAGE_SIZE = 32767
+
+# every chart gets the same creation date so identical inputs give
+# byte-identical output (honours the reproducible-builds SOURCE_DATE_EPOCH)
+
+CREATION_DATE = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(int(os.environ.get("SOURCE_DATE_EPOCH", 0))))
+
+
+def loadCairo():
+	
+	global cairo
+	
+	if cairo is None:
+		import cairo
+	
+	return(cairo)
+
+# numpy is optional too: when it's installed, big inputs are converted,
+# rounded & grouped a chunk of rows at a time as whole arrays (see readRows())
+
+numpy = None
+
+VECTOR_MIN_ROWS = 4096 # fewer rows than this aren't worth numpy's overhead
+VECTOR_CHUNK = 8192 # rows per vectorized chunk
+
+def loadNumpy():
+	
+	# the numpy module, or None if it isn't installed
+	
+	global numpy
+	
+	if numpy is None:
+		try:
+			import numpy
+		except ImportError:
+			numpy = False
+	
+	return(numpy or None)
 
 def split(input, size):
 	return [input[start:start+size] for start in range(0, len(input), size)]
 
-def splitThousands(s, tSep, dSep=None):
+def openCSV(filename):
+	
+	# the csv module wants binary files on python 2 & newline='' text on 3.
+	# "-" is stdin (left open when the file object is closed)
+	
+	if (filename == "-"):
+		stdin = io.open(sys.stdin.fileno(), 'rb', closefd=False)
+		if sys.version_info[0] < 3:
+			return(stdin)
+		return(io.TextIOWrapper(stdin, newline=''))
+	
+	if sys.version_info[0] < 3:
+		return(open(filename, 'rb'))
+	
+	return(open(filename, 'r', newline=''))
 
-	prefix = ''
-	if s.startswith('$'):
-		prefix = '$'
-		s = s.replace("$", "")
-		
-	if s.rfind('.')>0:
-		rhs=s[s.rfind('.')+1:]
-		s=s[:s.rfind('.')-1]
-		if len(s) <= 3: return s + dSep + rhs
-		
-		return prefix + splitThousands(s[:-3], tSep) + tSep + s[-3:] + dSep + rhs
+def csvSource(data):
+	
+	# CSV text (or utf-8 bytes) in memory as a file object for the csv module
+	
+	if sys.version_info[0] < 3:
+		return(io.BytesIO(data if isinstance(data, bytes) else data.encode("utf-8")))
+	
+	return(io.StringIO(data if not isinstance(data, bytes) else data.decode("utf-8"), newline=''))
+
+def stdoutBytes():
+	
+	# stdout for binary output (text written to it so far goes out first)
+	
+	sys.stdout.flush()
+	
+	return(getattr(sys.stdout, "buffer", sys.stdout))
+
+def columnIndex(names, column):
+	
+	# columns can be picked by header name or by (0-based) position
+	
+	if isinstance(column, int) or (names == None):
+		return(int(column))
+	
+	if column not in names:
+		raise ValueError("no column named '%s' in CSV header" % (column))
+	
+	return(names.index(column))
+
+def rankRow(beg, end, topBy):
+	
+	# how "interesting" a row is when only the top N are kept
+	
+	if (topBy == "abs_change"):
+		return(abs(end - beg))
+	elif (topBy == "rel_change"):
+		if (beg == 0):
+			return(float("inf"))
+		return(abs((end - beg) / beg))
+	elif (topBy == "start"):
+		return(beg)
+	elif (topBy == "end"):
+		return(end)
+	
+	raise ValueError("unknown top_by '%s'" % (topBy))
+
+def hexColor(color):
+	
+	# "RRGGBB" -> (r, g, b) in cairo's 0..1 range
+	
+	(r,g,b) = split(color,2)
+	
+	return( (int(r, 16)/255.0, int(g, 16)/255.0, int(b, 16)/255.0) )
+
+def pdeString(s):
+	
+	return(s.replace("\\", "\\\\").replace('"', '\\"'))
+
+def pngChunk(kind, data):
+	
+	# one length/type/data/CRC chunk of a PNG stream
+	
+	return(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+def pngPixels(data, opaque):
+	
+	# cairo pixels (native-endian, premultiplied 32-bit words) -> PNG RGB
+	# (opaque) or straight-alpha RGBA bytes, with slices doing the per-
+	# channel work; only partly transparent pixels get un-premultiplied
+	
+	if (sys.byteorder == "little"):
+		B, G, R, A = 0, 1, 2, 3
 	else:
-		if len(s) <= 3: return s
-		return prefix + splitThousands(s[:-3], tSep) + tSep + s[-3:]
+		A, R, G, B = 0, 1, 2, 3
+	
+	n = len(data) // 4
+	
+	if opaque:
+		pixels = bytearray(n * 3)
+		pixels[0::3] = data[R::4]
+		pixels[1::3] = data[G::4]
+		pixels[2::3] = data[B::4]
+		return(pixels)
+	
+	pixels = bytearray(n * 4)
+	pixels[0::4] = data[R::4]
+	pixels[1::4] = data[G::4]
+	pixels[2::4] = data[B::4]
+	pixels[3::4] = data[A::4]
+	
+	for m in re.finditer(b"[\x01-\xfe]", bytes(data[A::4])):
+		i = m.start() * 4
+		a = pixels[i + 3]
+		for c in (i, i + 1, i + 2):
+			pixels[c] = min(255, (pixels[c] * 255 + a // 2) // a)
+	
+	return(pixels)
 
-class PySlopegraph:
+def packPositions(positions, gap, low, high):
 	
-	starts = {} # starting "points"
-	ends = {} # ending "points"
-	pairs = [] # base pair array for the final plotting
+	# nudge sorted positions so neighbours are at least "gap" apart, staying
+	# inside [low, high] if they fit: one sweep down, one back up & (if that
+	# pushed the first one above "low" though they'd fit) one more down
 	
-	def readCSV(self, filename):
+	placed = list(positions)
+	
+	for i in range(1, len(placed)):
+		if (placed[i] < placed[i-1] + gap): placed[i] = placed[i-1] + gap
+	
+	if placed and (placed[-1] > high): placed[-1] = high
+	
+	for i in range(len(placed)-2, -1, -1):
+		if (placed[i] > placed[i+1] - gap): placed[i] = placed[i+1] - gap
+	
+	if placed and (placed[0] < low) and ((len(placed) - 1) * gap <= high - low):
+		placed[0] = low
+		for i in range(1, len(placed)):
+			if (placed[i] < placed[i-1] + gap): placed[i] = placed[i-1] + gap
+	
+	return(placed)
+
+# a formatted number: whatever comes before the integer digits (sign,
+# currency symbol), the digits & the rest (decimals, exponent, suffix)
+
+NUMBER_PARTS = re.compile(r"^([^0-9]*)([0-9]+)(.*)$", re.DOTALL)
+
+def splitThousands(s, tSep, dSep=None, grouping=(3, 0)):
+	
+	# group the integer digits of a formatted number; "grouping" is the
+	# localeconv() kind: group sizes from the right, then 0 (repeat the last
+	# one) or CHAR_MAX (no more groups). dSep (if given) replaces the "."
+	
+	m = NUMBER_PARTS.match(s)
+	if m is None:
+		return(s)
+	
+	prefix, digits, rest = m.groups()
+	
+	if (dSep != None) and rest.startswith("."):
+		rest = dSep + rest[1:]
+	
+	groups = []
+	end = len(digits)
+	size = None
+	
+	for g in grouping:
+		if (g == locale.CHAR_MAX) or (end <= 0):
+			break
+		if (g != 0):
+			size = g
+			groups.append(digits[max(0, end - size):end])
+			end -= size
+			continue
+		while (size != None) and (end > 0):
+			groups.append(digits[max(0, end - size):end])
+			end -= size
+		break
+	
+	if (end > 0):
+		groups.append(digits[:end])
+	
+	return(prefix + tSep.join(reversed(groups)) + rest)
+
+# setlocale() is process wide (& not thread safe), so locales are only
+# switched to briefly, under a lock, to read their number formatting
+
+localeLock = threading.Lock()
+
+def numberFormat(name):
+	
+	# (thousands separator, decimal point, grouping) of locale "name" ("" is
+	# the one set in the environment)
+	
+	with localeLock:
+		saved = locale.setlocale(locale.LC_NUMERIC)
+		try:
+			locale.setlocale(locale.LC_NUMERIC, name)
+			conv = locale.localeconv()
+		finally:
+			locale.setlocale(locale.LC_NUMERIC, saved)
+	
+	return((conv["thousands_sep"], conv["decimal_point"], tuple(conv["grouping"])))
+
+class TextMetrics:
+	
+	# LRU cache of cairo text_extents() results keyed by (font family, size,
+	# weight, string). If a filename is given the entries are loaded from &
+	# merged back into that (JSON) file so runs/batch workers can share them
+	
+	def __init__(self, size=20000, filename=None):
+		
+		self.size = size
+		self.filename = filename
+		self.entries = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.dirty = False
+		self.mtime = None
+		
+		if (self.filename != None) and os.path.exists(self.filename):
+			self.load()
+	
+	def extents(self, measure, family, size, weight, text):
 		
-		slopeReader = csv.reader(open(filename, 'rb'), delimiter=',', quotechar='"')
+		# "measure(family, size, weight, text)" is only called on a miss
 		
-		for row in slopeReader:
-			
-			# add chosen values (need start/end for each CSV row) to the final plotting array.
-			
-			lab = row[0] # label
-			beg = float(row[1]) # left vals
-			end = float(row[2]) # right vals
-			
-			if self.ROUND_PRECISION != None:
-				beg = round(beg,self.ROUND_PRECISION)
-				end = round(end,self.ROUND_PRECISION)
-			
-			if self.ORDER == "ascending":
-				self.pairs.append( (float(beg), float(end), -(float(end) - float(beg))) )
-			else:
-				self.pairs.append( (float(beg), float(end), (float(end) - float(beg))) )
-			
-			# combine labels of common values into one string
-			
-			if beg in self.starts:
-				self.starts[beg] = self.starts[beg] + "; " + lab
-			else:
-				self.starts[beg] = lab
+		key = (family, size, weight, text)
 		
-			
-			if end in self.ends:
-				self.ends[end] = self.ends[end] + "; " + lab
-			else:
-				self.ends[end] = lab
-
+		if key in self.entries:
+			self.hits += 1
+			val = self.entries.pop(key)
+			self.entries[key] = val
+			return(val)
+		
+		self.misses += 1
+		val = tuple(measure(family, size, weight, text))
+		self.store(key, val)
+		self.dirty = True
+		
+		return(val)
 	
-	def sortKeys(self):
+	def store(self, key, val):
 		
-		# sort all the values (in the event the CSV wasn't) so
-		# we can determine the smallest increment we need to use
-		# when stacking the labels and plotting points
+		if key in self.entries:
+			del self.entries[key]
+		self.entries[key] = val
 		
-		self.startSorted = [(k, self.starts[k]) for k in sorted(self.starts)]
-		self.endSorted = [(k, self.ends[k]) for k in sorted(self.ends)]
-		self.startKeys = sorted(self.starts.keys())
-		self.endKeys = sorted(self.ends.keys())
-
-		if (self.ORDER == "ascending"):
-			self.startSorted.reverse()
-			self.endSorted.reverse()
-			self.startKeys.reverse()
-			self.endKeys.reverse()
-				
-		self.delta = max(self.startSorted)
-		for i in range(len(self.startKeys)):
-			
-			if (i+1 <= len(self.startKeys)-1):
-				
-				if self.LOG_SCALE:
-					currDelta = math.log(abs(float(self.startKeys[i+1]))) - math.log(abs(float(self.startKeys[i])))
-				else:
-					currDelta = abs(float(self.startKeys[i+1]) - float(self.startKeys[i]))
-				
-				if (currDelta < self.delta): self.delta = currDelta
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+	
+	def readFile(self):
 		
-		for i in range(len(self.endKeys)):
-			
-			if (i+1 <= len(self.endKeys)-1):
-				
-				if self.LOG_SCALE:
-					currDelta = math.log(abs(float(self.endKeys[i+1]))) - math.log(abs(float(self.endKeys[i])))	
-				else:
-					currDelta = abs(float(self.endKeys[i+1]) - float(self.endKeys[i]))
-				
-				if (currDelta < self.delta): self.delta = currDelta
+		try:
+			with open(self.filename) as f:
+				data = json.load(f)
+			self.mtime = os.path.getmtime(self.filename)
+		except (IOError, OSError, ValueError):
+			return([])
+		
+		return(data)
+	
+	def load(self):
+		
+		for family, size, weight, text, val in self.readFile():
+			self.store((family, size, weight, text), tuple(val))
+	
+	def save(self):
+		
+		# merge in whatever other processes wrote since we last looked (our
+		# own entries win) & swap the file in atomically
+		
+		if (self.filename == None) or not self.dirty:
+			return
+		
+		if os.path.exists(self.filename) and (os.path.getmtime(self.filename) != self.mtime):
+			ours = self.entries
+			self.entries = collections.OrderedDict()
+			self.load()
+			for key in ours:
+				self.store(key, ours[key])
+		
+		data = [ list(key) + [ list(val) ] for key, val in self.entries.items() ]
+		
+		fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)))
+		with os.fdopen(fd, 'w') as f:
+			json.dump(data, f)
+		os.rename(tmp, self.filename)
+		
+		self.mtime = os.path.getmtime(self.filename)
+		self.dirty = False
+	
+	def stats(self):
+		
+		return({ "hits" : self.hits, "misses" : self.misses, "entries" : len(self.entries) })
+
+
+# glyph names of the printable ASCII characters (32-126), in order, & the
+# (public) Adobe core font advance widths for them, for "python" metrics
+# when there's no font file for a family
 
+AFM_ASCII = """space exclam quotedbl numbersign dollar percent ampersand quotesingle
+parenleft parenright asterisk plus comma hyphen period slash zero one two three
+four five six seven eight nine colon semicolon less equal greater question at
+A B C D E F G H I J K L M N O P Q R S T U V W X Y Z bracketleft backslash
+bracketright asciicircum underscore grave a b c d e f g h i j k l m n o p q r s
+t u v w x y z braceleft bar braceright asciitilde""".split()
+
+AFM_NAMES = dict([ (name, chr(32 + i)) for i, name in enumerate(AFM_ASCII) ])
+AFM_NAMES.update({ "quoteleft" : u"\u2018", "quoteright" : u"\u2019", "quotedblleft" : u"\u201c",
+					"quotedblright" : u"\u201d", "endash" : u"\u2013", "emdash" : u"\u2014", "bullet" : u"\u2022" })
+
+HELVETICA = [ 278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+			556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015,
+			667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778,
+			722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333,
+			556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556,
+			333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584 ]
+
+HELVETICA_BOLD = [ 278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+			556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611, 975,
+			722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778, 667, 778,
+			722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556, 333,
+			556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611, 611, 611,
+			389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584 ]
+
+class FontMetrics:
 	
-	def findExtremes(self):
+	# pure Python text measuring from the advance widths in a TrueType/
+	# OpenType (hmtx/cmap) or AFM file, or the built-in Helvetica tables
+	# when there's no file. no kerning & the ink width is taken to be the
+	# advance, so numbers are close to (not exactly) cairo's
+	
+	def __init__(self, filename=None, bold=False):
+		
+		self.unitsPerEm = 1000.0
+		self.ascent = 718.0
+		self.widths = {} # char -> advance (font units), filled in lazily for sfnt
+		self.lookup = None
+		
+		if filename is None:
+			self.widths = dict(zip([ chr(32 + i) for i in range(95) ], bold and HELVETICA_BOLD or HELVETICA))
+			self.missing = bold and 611 or 556
+		elif filename.lower().endswith(".afm"):
+			self.readAFM(filename)
+		else:
+			self.readSFNT(filename)
+	
+	def readAFM(self, filename):
+		
+		self.missing = None
+		
+		with open(filename) as f:
+			for line in f:
+				if line.startswith("Ascender "):
+					self.ascent = float(line.split()[1])
+				elif line.startswith("C "):
+					fields = dict([ field.split(None, 1) for field in line.split(";") if len(field.split()) > 1 ])
+					width = float(fields.get("WX", fields.get("W0X", 0)))
+					name = fields.get("N", "").strip()
+					code = re.match(r"^(uni|u)([0-9A-Fa-f]{4,6})$", name)
+					if name in AFM_NAMES:
+						self.widths[AFM_NAMES[name]] = width
+					elif code:
+						self.widths[unichr(int(code.group(2), 16))] = width
+		
+		self.missing = self.widths.get(u"n", 500.0)
+	
+	def readSFNT(self, filename):
+		
+		with open(filename, "rb") as f:
+			data = f.read()
+		
+		base = 0
+		if (data[:4] == b"ttcf"): # collection: use the first font
+			base = struct.unpack(">I", data[12:16])[0]
+		
+		tables = {}
+		numTables = struct.unpack(">H", data[base+4:base+6])[0]
+		for i in range(numTables):
+			rec = base + 12 + 16*i
+			tables[data[rec:rec+4]] = struct.unpack(">I", data[rec+8:rec+12])[0]
+		
+		head, hhea, hmtx, cmap = tables[b"head"], tables[b"hhea"], tables[b"hmtx"], tables[b"cmap"]
+		
+		self.unitsPerEm = float(struct.unpack(">H", data[head+18:head+20])[0])
+		self.ascent = float(struct.unpack(">h", data[hhea+4:hhea+6])[0])
+		
+		numberOfHMetrics = struct.unpack(">H", data[hhea+34:hhea+36])[0]
+		self.advances = struct.unpack(">%dH" % (2 * numberOfHMetrics), data[hmtx:hmtx + 4*numberOfHMetrics])[0::2]
+		
+		# the best unicode cmap subtable: full (format 12) over BMP (format 4)
+		
+		subtables = {}
+		for i in range(struct.unpack(">H", data[cmap+2:cmap+4])[0]):
+			platform, encoding, offset = struct.unpack(">HHI", data[cmap+4+8*i:cmap+12+8*i])
+			subtables[(platform, encoding)] = cmap + offset
+		
+		for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+			if key not in subtables:
+				continue
+			sub = subtables[key]
+			fmt = struct.unpack(">H", data[sub:sub+2])[0]
+			if (fmt == 12):
+				groups = struct.unpack(">I", data[sub+12:sub+16])[0]
+				table = struct.unpack(">%dI" % (3 * groups), data[sub+16:sub+16 + 12*groups])
+				self.lookup = (12, table[0::3], table[1::3], table[2::3])
+				break
+			elif (fmt == 4):
+				segs = struct.unpack(">H", data[sub+6:sub+8])[0] // 2
+				ends = struct.unpack(">%dH" % segs, data[sub+14:sub+14 + 2*segs])
+				starts = struct.unpack(">%dH" % segs, data[sub+16 + 2*segs:sub+16 + 4*segs])
+				deltas = struct.unpack(">%dH" % segs, data[sub+16 + 4*segs:sub+16 + 6*segs])
+				rangePos = sub+16 + 6*segs
+				ranges = struct.unpack(">%dH" % segs, data[rangePos:rangePos + 2*segs])
+				self.lookup = (4, starts, ends, deltas, ranges, rangePos, data)
+				break
+		
+		self.missing = self.advances[0] # .notdef
+	
+	def glyph(self, c):
+		
+		# character code -> glyph id (0 if the font hasn't got it)
+		
+		if self.lookup is None:
+			return(0)
+		
+		if (self.lookup[0] == 12):
+			fmt, starts, ends, firsts = self.lookup
+			i = bisect.bisect_left(ends, c)
+			if (i < len(ends)) and (starts[i] <= c):
+				return(firsts[i] + c - starts[i])
+			return(0)
+		
+		fmt, starts, ends, deltas, ranges, rangePos, data = self.lookup
+		i = bisect.bisect_left(ends, c)
+		if (i >= len(ends)) or (starts[i] > c):
+			return(0)
+		if (ranges[i] == 0):
+			return((c + deltas[i]) & 0xffff)
+		addr = rangePos + 2*i + ranges[i] + 2*(c - starts[i])
+		g = struct.unpack(">H", data[addr:addr+2])[0]
+		if g:
+			g = (g + deltas[i]) & 0xffff
+		return(g)
+	
+	def advance(self, ch):
 		
-		# we also need to find the absolute min & max values
-		# so we know how to scale the plots
+		if ch in self.widths:
+			return(self.widths[ch])
 		
-		if self.LOG_SCALE:
-			self.lowest = math.log(min(self.startKeys))
-			if (math.log(min(self.endKeys)) < self.lowest) : self.lowest = math.log(min(self.endKeys))
-			
-			self.highest = math.log(max(self.startKeys))
-			if (math.log(max(self.endKeys)) > self.highest) : self.highest = math.log(max(self.endKeys))
+		if self.lookup is None:
+			width = self.missing
 		else:
-			self.lowest = min(self.startKeys)
-			if (min(self.endKeys) < self.lowest) : self.lowest = min(self.endKeys)
-			
-			self.highest = max(self.startKeys)
-			if (max(self.endKeys) > self.highest) : self.highest = max(self.endKeys)
+			g = self.glyph(ord(ch))
+			width = self.advances[min(g, len(self.advances) - 1)]
 		
-		self.delta = float(self.delta)
-		self.lowest = float(self.lowest)
-		self.highest = float(self.highest)
+		self.widths[ch] = width
+		return(width)
 	
-	def calculateExtents(self, filename, format, valueFormatString):
+	def extents(self, size, text):
 		
-		if (format == "pdf"):
-			surface = cairo.PDFSurface (filename, self.TMP_W, self.TMP_H)
-		elif (format == "ps"):
-			surface = cairo.PSSurface(filename, self.TMP_W, self.TMP_H)
-			surface.set_eps(True)
-		elif (format == "svg"):
-			surface = cairo.SVGSurface (filename, self.TMP_W, self.TMP_H)
-		elif (format == "png"):
-			surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, int(self.TMP_W), int(self.TMP_H))
-		elif (format == "js"):
-			surface = cairo.SVGSurface (None, self.TMP_W, self.TMP_H)
-		else:
-			surface = cairo.PDFSurface (filename, self.TMP_W, self.TMP_H)
+		# same shape as cairo's text_extents(): (x_bearing, y_bearing,
+		# width, height, x_advance, y_advance)
 		
-		cr = cairo.Context(surface)
-		cr.save()
-		cr.select_font_face(self.LABEL_FONT_FAMILY, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-		cr.set_font_size(self.LABEL_FONT_SIZE)
-		cr.set_line_width(self.LINE_WIDTH)
+		scale = size / self.unitsPerEm
+		width = sum([ self.advance(ch) for ch in text ]) * scale
 		
-		# find the *real* maximum label width (not just based on number of chars)
+		return((0.0, -self.ascent * scale, width, self.ascent * scale, width, 0.0))
+
+# parsed fonts, shared by every renderer in the process: (file, bold) -> FontMetrics
+
+fontMetricsCache = {}
+
+def fontMetrics(filename, bold):
+	
+	key = (filename, bold)
+	if key not in fontMetricsCache:
+		fontMetricsCache[key] = FontMetrics(filename, bold)
+	
+	return(fontMetricsCache[key])
+
+def sharedMetrics(filename):
+	
+	# the TextMetrics a "--metrics-cache" file gives (None without one, so
+	# a config's own "metrics_cache" still applies)
+	
+	if filename == None:
+		return(None)
+	
+	return(TextMetrics(filename=filename))
+
+class PySlopegraph:
+	
+	def reset(self):
+		
+		# per-chart state; lives on the instance so nothing leaks from
+		# one chart to the next when a renderer is reused
+		
+		self.labels = [] # row labels
+		self.columns = [ array.array('d') for c in range(self.PERIODS) ] # one value array per period
+		self.starts = {} # starting "points"
+		self.ends = {} # ending "points"
+		self.startGroups = {} # labels sharing a starting value
+		self.endGroups = {} # labels sharing an ending value
+		self.strokes = 0 # cairo strokes issued (for --stats)
+		self.tracked = None # incremental update structures (see track())
+		self.vectorized = None # numpy, if readRows() used it
+	
+	def useCairo(self):
 		
-		maxLabelWidth = 0
-		maxNumWidth = 0
+		# import cairo & set up the font options the first time it's needed
 		
-		sKeys = sorted(self.startKeys)
-		if (self.ORDER == "ascending"):
-			sKeys.reverse()
-		
-		for k in sKeys:
-			s1 = self.starts[k]
-			xbearing, ybearing, self.sWidth, self.sHeight, xadvance, yadvance = (cr.text_extents(s1))
-			if (self.sWidth > maxLabelWidth) : maxLabelWidth = self.sWidth
-			txt = valueFormatString % (k)
-			txt = txt.strip()
-			if self.ADD_COMMAS:
-				txt = splitThousands(txt,',')
-			xbearing, ybearing, self.startMaxLabelWidth, startMaxLabelHeight, xadvance, yadvance = (cr.text_extents(txt))
-			if (self.startMaxLabelWidth > maxNumWidth) : maxNumWidth = self.startMaxLabelWidth
-		
-		self.sWidth = maxLabelWidth
-		self.startMaxLabelWidth = maxNumWidth
-		
-		maxLabelWidth = 0
-		maxNumWidth = 0
-
-		sKeys = sorted(self.endKeys)
-		if (self.ORDER == "ascending"):
-			sKeys.reverse()
-				
-		for k in sKeys:
-			e1 = self.ends[k]
-			xbearing, ybearing, self.eWidth, eHeight, xadvance, yadvance = (cr.text_extents(e1))
-			if (self.eWidth > maxLabelWidth) : maxLabelWidth = self.eWidth
-			txt = valueFormatString % (k)
-			txt = txt.strip()
-			if self.ADD_COMMAS:
-				txt = splitThousands(txt,',')
-			xbearing, ybearing, self.endMaxLabelWidth, endMaxLabelHeight, xadvance, yadvance = (cr.text_extents(txt))
-			if (self.endMaxLabelWidth > maxNumWidth) : maxNumWidth = self.endMaxLabelWidth
-		
-		self.eWidth = maxLabelWidth
-		self.endMaxLabelWidth = maxNumWidth
+		loadCairo()
 		
-		cr.restore()
-		cr.show_page()
-		surface.finish()
+		if self.fontOptions is None:
+			self.fontOptions = cairo.FontOptions()
+			self.fontOptions.set_hint_metrics(cairo.HINT_METRICS_OFF)
+	
+	def fontFace(self, family, weight):
 		
-		self.width = self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.SPACE_WIDTH + self.SLOPE_LENGTH + self.SPACE_WIDTH + self.endMaxLabelWidth + self.SPACE_WIDTH + self.eWidth + self.X_MARGIN ;
-		self.height = (self.Y_MARGIN * 2) + (((self.highest - self.lowest) / self.delta) * self.LINE_HEIGHT)
+		# font faces are created once per renderer & reused across charts
 		
-		self.HEADER_SPACE = 0.0
-		if (self.HEADER_FONT_FAMILY != None):
-			self.HEADER_SPACE = self.HEADER_FONT_SIZE + 2*self.LINE_HEIGHT
-			self.height += self.HEADER_SPACE
+		key = (family, weight)
+		if key not in self.fontFaces:
+			self.fontFaces[key] = cairo.ToyFontFace(family, cairo.FONT_SLANT_NORMAL, weight)
 		
+		return(self.fontFaces[key])
 	
-	def makeSlopegraph(self, filename, config):
+	def measureText(self, family, size, weight, text):
 		
-		(lab_r,lab_g,lab_b) = split(self.LABEL_COLOR,2)
-		LAB_R = (int(lab_r, 16)/255.0)
-		LAB_G = (int(lab_g, 16)/255.0)
-		LAB_B = (int(lab_b, 16)/255.0)
+		# text is measured on one tiny in-memory surface that lives as long as
+		# the renderer, never on the output surface. metric hinting is off
+		# (here & when drawing) so the numbers don't depend on the format
 		
-		(val_r,val_g,val_b) = split(self.VALUE_COLOR,2)
-		VAL_R = (int(val_r, 16)/255.0)
-		VAL_G = (int(val_g, 16)/255.0)
-		VAL_B = (int(val_b, 16)/255.0)
+		if self.measureCr is None:
+			self.useCairo()
+			self.measureCr = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+			self.measureCr.set_font_options(self.fontOptions)
 		
-		(line_r,line_g,line_b) = split(self.SLOPE_COLOR,2)
-		LINE_R = (int(line_r, 16)/255.0)
-		LINE_G = (int(line_g, 16)/255.0)
-		LINE_B = (int(line_b, 16)/255.0)
+		if self.measureFont != (family, size, weight):
+			self.measureCr.set_font_face(self.fontFace(family, weight))
+			self.measureCr.set_font_size(size)
+			self.measureFont = (family, size, weight)
 		
-		(line_up_r,line_up_g,line_up_b) = split(self.SLOPE_UP_COLOR,2)
-		LINE_UP_R = (int(line_up_r, 16)/255.0)
-		LINE_UP_G = (int(line_up_g, 16)/255.0)
-		LINE_UP_B = (int(line_up_b, 16)/255.0)
+		return(self.measureCr.text_extents(text))
+	
+	def measureFile(self, font, size, weight, text):
 		
-		(line_down_r,line_down_g,line_down_b) = split(self.SLOPE_DOWN_COLOR,2)
-		LINE_DOWN_R = (int(line_down_r, 16)/255.0)
-		LINE_DOWN_G = (int(line_down_g, 16)/255.0)
-		LINE_DOWN_B = (int(line_down_b, 16)/255.0)
+		# "python" font metrics; "font" is a font file or "builtin"
 		
-		if (self.BACKGROUND_COLOR != "transparent"):
-			(bg_r,bg_g,bg_b) = split(self.BACKGROUND_COLOR,2)
-			BG_R = (int(bg_r, 16)/255.0)
-			BG_G = (int(bg_g, 16)/255.0)
-			BG_B = (int(bg_b, 16)/255.0)
-		
-		if (config['format'] == "pdf"):
-			surface = cairo.PDFSurface (filename, self.width, self.height)
-		elif (config['format'] == "ps"):
-			surface = cairo.PSSurface(filename, self.width, self.height)
-			surface.set_eps(True)
-		elif (config['format'] == "svg"):
-			surface = cairo.SVGSurface (filename, self.width, self.height)
-		elif (config['format'] == "pde"):
-			surface = cairo.SVGSurface (None, self.width, self.height)
-			pde = """void setup()
-{
-	size(%d,%d);
-""" % (self.width, self.height)
-
-		elif (config['format'] == "js"):
-			surface = cairo.SVGSurface (None, self.width, self.height)
-			paper = """<html>
-   <head>
-        <title></title>
-        <script type="text/javascript" src="raphael-min.js"></script>
-        <style type="text/css">
-            #%s {
-                width: %d;
-            }
-        </style>
-        <script>
-			window.onload = function() {
-				
-				var %s_delay = 1000 ;
-				var %s = new Raphael(document.getElementById('%s'), %d, %d);
-				var %s_headers = new Array();
-				var %s_lines = new Array();
-				var %s_labels = new Array() ;
-				var %s_values = new Array() ;
-""" % (self.RAPHAEL_SURFACE_NAME, self.width, self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.width, self.height, self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, )
+		if (font == "builtin"):
+			return(fontMetrics(None, weight == FONT_WEIGHT_BOLD).extents(size, text))
 		
-		elif (config['format'] == "png"):
-			surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, int(self.width), int(self.height))
-		else:
-			surface = cairo.PDFSurface (filename, self.width, self.height)
+		return(fontMetrics(font, False).extents(size, text))
+	
+	def textExtents(self, text, family=None, size=None, weight=FONT_WEIGHT_NORMAL):
 		
-		cr = cairo.Context(surface)
+		# all text measuring goes through the metrics cache (label font by
+		# default); "python" metrics are cached under the font file (or
+		# "builtin") so they never mix with cairo's numbers for the family
 		
-		cr.save()
+		if family == None:
+			family = self.LABEL_FONT_FAMILY
+			size = self.LABEL_FONT_SIZE
 		
-		cr.set_line_width(self.LINE_WIDTH)
+		if (self.FONT_METRICS == "cairo"):
+			return(self.metrics.extents(self.measureText, family, size, weight, text))
 		
-		if (self.BACKGROUND_COLOR != "transparent"):
-			cr.set_source_rgb(BG_R,BG_G,BG_B)
-			cr.rectangle(0,0,self.width,self.height)
-			cr.fill()
-			if (config['format'] == 'js'):
-				paper += "				%s.rect(0,0,%s,%s).attr({fill:'#%s',stroke:'#%s'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width,self.height,self.BACKGROUND_COLOR,self.BACKGROUND_COLOR)
-			elif (config['format'] == "pde"):
-				pde += """	background(0x%s);
-""" % (self.BACKGROUND_COLOR)
+		font = None
+		if (weight == FONT_WEIGHT_BOLD):
+			font = self.FONT_FILES.get(family + ":bold")
+		if font == None:
+			font = self.FONT_FILES.get(family, "builtin")
 		
-		# draw headers (if present)
+		return(self.metrics.extents(self.measureFile, font, size, weight, text))
+	
+	def readCSV(self, filename):
 		
-		if (self.HEADER_FONT_FAMILY != None):
-			
-			(header_r,header_g,header_b) = split(self.HEADER_COLOR,2)
-			HEADER_R = (int(header_r, 16)/255.0)
-			HEADER_G = (int(header_g, 16)/255.0)
-			HEADER_B = (int(header_b, 16)/255.0)
-			
-			cr.save()
-			
-			cr.select_font_face(self.HEADER_FONT_FAMILY, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-			cr.set_font_size(self.HEADER_FONT_SIZE)
-			cr.set_source_rgb(HEADER_R,HEADER_G,HEADER_B)
-			
-			xbearing, ybearing, hWidth, hHeight, xadvance, yadvance = (cr.text_extents(config["labels"][0]))
-			cr.move_to(self.X_MARGIN + self.sWidth - hWidth, self.Y_MARGIN + self.HEADER_FONT_SIZE)
-			cr.show_text(config["labels"][0])
-			
-			xbearing, ybearing, hWidth, hHeight, xadvance, yadvance = (cr.text_extents(config["labels"][1]))
-			cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_FONT_SIZE)
-			cr.show_text(config["labels"][1])
-			
-			cr.stroke()
-			
-			cr.restore()
-			
-			if (config['format'] == 'js'):
-				paper += "				%s_headers[0] = %s.text(%d, %d, '%s').attr({'font':'%spx %s','font-family':'%s','font-size':'%d','font-weight':'bold','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth, self.Y_MARGIN + self.HEADER_FONT_SIZE, config["labels"][0], self.HEADER_FONT_SIZE, self.HEADER_FONT_FAMILY, self.HEADER_FONT_FAMILY, self.HEADER_FONT_SIZE, self.HEADER_COLOR)
-				paper += "				%s_headers[1] = %s.text(%d, %d, '%s').attr({'font':'%spx %s','font-family':'%s','font-size':'%d','font-weight':'bold','fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_FONT_SIZE, config["labels"][1], self.HEADER_FONT_SIZE, self.HEADER_FONT_FAMILY, self.HEADER_FONT_FAMILY, self.HEADER_FONT_SIZE,self.HEADER_COLOR)
-				
+		# "filename" may also be an already open (text) file object
 		
-		# draw start labels at the correct positions
+		if hasattr(filename, "read"):
+			self.readRows(self.selectRows(filename))
+			return
 		
-		cr.select_font_face(self.LABEL_FONT_FAMILY, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-		cr.set_font_size(self.LABEL_FONT_SIZE)
+		f = openCSV(filename)
 		
-		valueFormatString = config["value_format_string"]
-
-# 		sKeys = sorted(self.startKeys)
-# 		if (self.ORDER == "ascending"):
-# 			sKeys.reverse()
+		try:
+			self.readRows(self.selectRows(f))
+		finally:
+			f.close()
+	
+	def selectRows(self, f, continued=False):
 		
-		for k in self.startKeys:
-			
-			val = float(k)
-			label = self.starts[k]
-			xbearing, ybearing, lWidth, lHeight, xadvance, yadvance = (cr.text_extents(label))
-			txt = valueFormatString % (val)
-			txt = txt.strip()
-			if self.ADD_COMMAS:
-				txt = splitThousands(txt,',')
-			xbearing, ybearing, kWidth, kHeight, xadvance, yadvance = (cr.text_extents(txt))
-			
-			cr.set_source_rgb(LAB_R,LAB_G,LAB_B)
-			if self.LOG_SCALE:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + (self.sWidth - lWidth), self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth , self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-				else:
-					cr.move_to(self.X_MARGIN + (self.sWidth - lWidth), self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth , self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-			else:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + (self.sWidth - lWidth), self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth, self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
+		# stream (label, value, ...) rows out of an open CSV file
+		
+		for facet, row in self.scanRows(f, continued):
+			yield row
+	
+	def readFacets(self, filename):
+		
+		# split the CSV (a file name or open file object) into its facets in
+		# one scan: an ordered { facet : [ (label, value, ...), ... ] }
+		
+		facets = collections.OrderedDict()
+		
+		if hasattr(filename, "read"):
+			f = filename
+		else:
+			f = openCSV(filename)
+		
+		try:
+			for facet, row in self.scanRows(f):
+				if facet in facets:
+					facets[facet].append(row)
 				else:
-					cr.move_to(self.X_MARGIN + (self.sWidth - lWidth), self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-			cr.show_text(label)
+					facets[facet] = [ row ]
+		finally:
+			if f is not filename:
+				f.close()
+		
+		return(facets)
+	
+	def scanRows(self, f, continued=False):
+		
+		# stream (facet, (label, value, ...)) pairs out of an open CSV file,
+		# picking the columns & applying the label allow-list and top-N (per
+		# facet) as we go; only the N best rows (not the whole file) are ever
+		# held in memory. the facet is None unless "facet_by" is set. a
+		# "continued" file is more rows of the last one: no header, same names
+		
+		source = f
+		
+		if continued:
+			names = self.csvNames
+			slopeReader = csv.reader(source, delimiter=',', quotechar='"')
+		else:
+			header = self.CSV_HEADER
+			if (header == "auto"):
+				# sniff (at least) the first 64K of whole lines, then put
+				# them back in front of the rest: no seeking, so pipes work
+				sample = []
+				size = 0
+				while (size < 65536):
+					line = f.readline()
+					if not line:
+						break
+					sample.append(line)
+					size += len(line)
+				header = bool(sample) and csv.Sniffer().has_header("".join(sample))
+				source = itertools.chain(sample, f)
 			
-			cr.set_source_rgb(VAL_R,VAL_G,VAL_B)
-			txt = valueFormatString % (val)
-			txt = txt.strip()
-			if self.ADD_COMMAS:
-				txt = splitThousands(txt,',')
+			slopeReader = csv.reader(source, delimiter=',', quotechar='"')
 			
-			if self.LOG_SCALE:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + (self.startMaxLabelWidth - kWidth), self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-				else:
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + (self.startMaxLabelWidth - kWidth), self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
+			names = None
+			if header:
+				names = next(slopeReader, None)
+			self.csvNames = names
+		
+		cols = [ columnIndex(names, c) for c in self.CSV_COLUMNS ]
+		labCol = cols[0]
+		valCols = cols[1:]
+		
+		facetCol = None
+		if self.FACET_BY != None:
+			facetCol = columnIndex(names, self.FACET_BY)
+		
+		allowed = None
+		if self.INCLUDE_LABELS != None:
+			allowed = set(self.INCLUDE_LABELS)
+		
+		best = {} # facet -> heap
+		seq = 0
+		facet = None
+		
+		for row in slopeReader:
+			
+			if not row:
+				continue
+			
+			lab = row[labCol]
+			if (allowed != None) and (lab not in allowed):
+				continue
+			
+			if facetCol != None:
+				facet = row[facetCol]
+			elif self.TOP_N == None:
+				# straight through: readRows() converts the values (in bulk)
+				yield (facet, (lab,) + tuple([ row[c] for c in valCols ]))
+				continue
+			
+			vals = tuple([ float(row[c]) for c in valCols ])
+			
+			if self.TOP_N == None:
+				yield (facet, (lab,) + vals)
+				continue
+			
+			# bounded min-heap of the N best rows seen so far (earlier rows
+			# win ties); "seq" puts the survivors back in file order
+			
+			if facet in best:
+				heap = best[facet]
 			else:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + (self.startMaxLabelWidth - kWidth), self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth , self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-				else:
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + (self.startMaxLabelWidth - kWidth), self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':'%d','fill':'#%s','text-anchor':'end'});\n" % (self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth , self.Y_MARGIN + self.HEADER_SPACE + (self.highest - (val)) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-			cr.show_text(txt)
+				heap = best[facet] = []
 			
-			cr.stroke()
+			item = (rankRow(vals[0], vals[-1], self.TOP_BY), -seq, lab, vals)
+			if len(heap) < self.TOP_N:
+				heapq.heappush(heap, item)
+			elif item > heap[0]:
+				heapq.heapreplace(heap, item)
+			seq += 1
+		
+		survivors = []
+		for facet, heap in best.items():
+			survivors.extend([ (-negSeq, facet, lab, vals) for rank, negSeq, lab, vals in heap ])
+		
+		survivors.sort(key=lambda item: item[0])
+		for seq, facet, lab, vals in survivors:
+			yield (facet, (lab,) + vals)
+	
+	def readRows(self, rows):
 		
-		# draw end labels at the correct positions
-
-# 		sKeys = sorted(self.endKeys)
-# 		if (self.ORDER == "ascending"):
-# 			sKeys.reverse()
+		# rows are (label, value, value, ...) sequences, one value per period;
+		# CSV rows or any other iterable
+		
+		periods = range(self.PERIODS)
 		
-		for k in self.endKeys:
+		self.tracked = None # bulk reads go around the incremental structures
+		self.vectorized = None
+		
+		if (self.VECTORIZE != "no"):
 			
-			val = float(k)
-			label = self.ends[k]
-			xbearing, ybearing, lWidth, lHeight, xadvance, yadvance = (cr.text_extents(label))
+			rows = iter(rows)
+			chunk = list(itertools.islice(rows, VECTOR_CHUNK))
 			
-			cr.set_source_rgb(VAL_R,VAL_G,VAL_B)
-			txt = valueFormatString % (val)
-			txt = txt.strip()
-			if self.ADD_COMMAS:
-				txt = splitThousands(txt,',')
+			np = None
+			if (self.VECTORIZE == "yes") or (len(chunk) >= VECTOR_MIN_ROWS):
+				np = loadNumpy()
 			
-			if self.LOG_SCALE:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-				else:
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
+			if np is not None:
+				self.vectorized = np
+				first = len(self.labels)
+				while chunk:
+					self.readChunk(np, chunk)
+					chunk = list(itertools.islice(rows, VECTOR_CHUNK))
+				self.groupRows(np, first)
+				return
+			
+			rows = itertools.chain(chunk, rows)
+		
+		for row in rows:
+			
+			# add chosen values (need one per period for each row) to the value columns
+			
+			lab = row[0] # label
+			
+			for c in periods:
+				val = float(row[c+1])
+				if self.ROUND_PRECISION != None:
+					val = round(val,self.ROUND_PRECISION)
+				self.columns[c].append(val)
+			
+			self.labels.append(lab)
+			
+			beg = self.columns[0][-1] # left vals
+			end = self.columns[-1][-1] # right vals
+			
+			# group labels of common values (joined once, in groupLabels())
+			
+			if beg in self.startGroups:
+				self.startGroups[beg].append(lab)
 			else:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-				else:
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta), (txt), self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.VALUE_COLOR)
-			cr.show_text(txt)
+				self.startGroups[beg] = [ lab ]
 			
-			cr.set_source_rgb(LAB_R,LAB_G,LAB_B)
-			if self.LOG_SCALE:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth , self.Y_MARGIN + self.HEADER_SPACE + (math.log(val) - self.lowest) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-				else:
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth , self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(val)) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
+			if end in self.endGroups:
+				self.endGroups[end].append(lab)
 			else:
-				if (self.ORDER == "ascending"):	####
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth , self.Y_MARGIN + self.HEADER_SPACE + (val - self.lowest) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-				else:
-					cr.move_to(self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta))
-					if (config['format'] == 'js'):
-						paper += "				%s.text(%d, %d, '%s').attr({'font':'%dpx %s','font-family':'%s','font-size':%s,'fill':'#%s','text-anchor':'start'});\n" % (self.RAPHAEL_SURFACE_NAME, self.width - self.X_MARGIN - self.SPACE_WIDTH - self.eWidth , self.Y_MARGIN + self.HEADER_SPACE + (self.highest - val) * self.LINE_HEIGHT * (1/self.delta), label, self.LABEL_FONT_SIZE, self.LABEL_FONT_FAMILY, self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE, self.LABEL_COLOR)
-			cr.show_text(label)
+				self.endGroups[end] = [ lab ]
+	
+	def readChunk(self, np, chunk):
+		
+		# readRows() for a list of rows, a column at a time with numpy. numpy
+		# parses strings to the same (correctly rounded) doubles as float();
+		# rounding is still python's round() (once per distinct value) since
+		# np.round() isn't correctly rounded & could differ in the last bit
+		
+		for c in range(self.PERIODS):
 			
-			cr.stroke()
+			vals = np.asarray(list(map(operator.itemgetter(c+1), chunk)), dtype=np.float64)
+			
+			if self.ROUND_PRECISION != None:
+				# distinct bit patterns, so -0.0 & 0.0 each keep their sign
+				uniq, where = np.unique(vals.view(np.int64), return_inverse=True)
+				uniq = np.array([ round(v, self.ROUND_PRECISION) for v in uniq.view(np.float64).tolist() ], dtype=np.float64)
+				vals = uniq[where.reshape(-1)]
+			
+			column = self.columns[c]
+			(getattr(column, "frombytes", None) or column.fromstring)(vals.tobytes()) # (fromstring on 2.7)
 		
-		# draw lines
+		self.labels.extend(map(operator.itemgetter(0), chunk))
+	
+	def groupRows(self, np, first):
 		
-		cr.set_line_width(self.LINE_WIDTH)
-		cr.set_source_rgb(LINE_R, LINE_G, LINE_B)
+		# group the labels of rows "first" on by their start & end values in
+		# one go: a stable sort by value keeps each group's labels in row
+		# order & its first row's value is the key (as a dict would have it)
 		
-		slopeColor = self.SLOPE_COLOR
-
-		if (config['format'] == 'js'):
-			lineCount = 0
-			for s1,e1,slope_val in self.pairs:
+		labels = self.labels[first:]
+		if not labels:
+			return
+		
+		for groups, column in ((self.startGroups, self.columns[0]), (self.endGroups, self.columns[-1])):
 			
-				if (slope_val > 0):
-					cr.set_source_rgb(LINE_UP_R, LINE_UP_G, LINE_UP_B)
-					slopeColor = self.SLOPE_UP_COLOR
-				elif (slope_val < 0):
-					cr.set_source_rgb(LINE_DOWN_R, LINE_DOWN_G, LINE_DOWN_B)
-					slopeColor = self.SLOPE_DOWN_COLOR
+			vals = np.frombuffer(column, dtype=np.float64)[first:]
+			order = np.argsort(vals, kind="stable")
+			ordered = vals[order]
+			bounds = (np.flatnonzero(ordered[1:] != ordered[:-1]) + 1).tolist()
+			starts = [ 0 ] + bounds
+			grouped = list(map(labels.__getitem__, order.tolist()))
+			chunkGroups = zip(ordered[starts].tolist(), map(grouped.__getitem__, map(slice, starts, bounds + [ len(grouped) ])))
+			
+			if not groups:
+				groups.update(chunkGroups)
+				continue
+			
+			for key, group in chunkGroups:
+				if key in groups:
+					groups[key].extend(group)
 				else:
-					cr.set_source_rgb(LINE_R, LINE_G, LINE_B) #self.SPACE_WIDTH + self.endMaxLabelWidth + self.SPACE_WIDTH + self.eWidth + self.X_MARGIN
-					slopeColor = self.SLOPE_COLOR
-
-				paper += "				%s_lines[%s] = %s.path('M %s 0 L %s 0').attr({'stroke-width':%s,stroke:'#%s'});\n" % (self.RAPHAEL_SURFACE_NAME, lineCount, self.RAPHAEL_SURFACE_NAME, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA, self.LINE_WIDTH, slopeColor)
-				lineCount += 1
+					groups[key] = group
+	
+	def joinLabels(self, labels):
 		
-		lineCount = 0
-		for s1,e1,slope_val in self.pairs:
-			
-			if (slope_val > 0):
-				cr.set_source_rgb(LINE_UP_R, LINE_UP_G, LINE_UP_B)
-				slopeColor = self.SLOPE_UP_COLOR
-			elif (slope_val < 0):
-				cr.set_source_rgb(LINE_DOWN_R, LINE_DOWN_G, LINE_DOWN_B)
-				slopeColor = self.SLOPE_DOWN_COLOR
+		limit = self.LABEL_GROUP_LIMIT
+		
+		if (limit != None) and (len(labels) > limit):
+			return("; ".join(labels[:limit]) + " (+%d more)" % (len(labels) - limit))
+		
+		return("; ".join(labels))
+	
+	def groupLabels(self):
+		
+		# combine labels of common values into one string
+		
+		self.starts = dict([ (k, self.joinLabels(v)) for k, v in self.startGroups.items() ])
+		self.ends = dict([ (k, self.joinLabels(v)) for k, v in self.endGroups.items() ])
+	
+	def sortKeys(self):
+		
+		# sort the unique values of every period (in the event the CSV
+		# wasn't) & find the smallest gap between neighbouring values
+		# (only the "delta" layout really needs it)
+		
+		np = self.vectorized
+		
+		self.columnKeys = [ sorted(self.starts) ]
+		for column in self.columns[1:-1]:
+			if np is not None:
+				# each key as first seen (np.unique() alone may turn -0.0 into 0.0)
+				values = np.frombuffer(column, dtype=np.float64)
+				self.columnKeys.append(values[np.unique(values, return_index=True)[1]].tolist())
 			else:
-				cr.set_source_rgb(LINE_R, LINE_G, LINE_B) #self.SPACE_WIDTH + self.endMaxLabelWidth + self.SPACE_WIDTH + self.eWidth + self.X_MARGIN
-				slopeColor = self.SLOPE_COLOR
+				self.columnKeys.append(sorted(set(column)))
+		self.columnKeys.append(sorted(self.ends))
+		
+		self.delta = float("inf")
+		for keys in self.columnKeys:
+			
+			# (math.log() rather than numpy's log, whose last bit may differ)
 			
 			if self.LOG_SCALE:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (math.log(s1) - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					cr.line_to(self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (math.log(e1) - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					if (config['format'] == 'js'):
-						paper += "				%s_lines[%s].animate({path:'M %s %s L %s %s'},%s_delay);\n" % (self.RAPHAEL_SURFACE_NAME, lineCount, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (math.log(s1) - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8,	self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA,	self.Y_MARGIN + self.HEADER_SPACE + (math.log(e1) - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8, self.RAPHAEL_SURFACE_NAME)
-				else:
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(s1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					cr.line_to(self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(e1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					if (config['format'] == 'js'):
-						paper += "				%s_lines[%s].animate({path:'M %s %s L %s %s'},%s_delay);\n" % (self.RAPHAEL_SURFACE_NAME, lineCount, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(s1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8,	self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA,	self.Y_MARGIN + self.HEADER_SPACE + (self.highest - math.log(e1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8, self.RAPHAEL_SURFACE_NAME)
-			else:
-				if (self.ORDER == "ascending"): ####
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (s1 - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					cr.line_to(self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (e1 - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					if (config['format'] == 'js'):
-						paper += "				%s_lines[%s].animate({path:'M %s %s L %s %s'},%s_delay);\n" % (self.RAPHAEL_SURFACE_NAME, lineCount, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (s1 - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8,	self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA,	self.Y_MARGIN + self.HEADER_SPACE + (e1 - self.lowest) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8, self.RAPHAEL_SURFACE_NAME)
+				keys = [ math.log(k) for k in keys ]
+			
+			if (len(keys) > 1):
+				if np is not None:
+					currDelta = np.diff(np.array(keys, dtype=np.float64)).min().item()
 				else:
-					cr.move_to(self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - s1) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					cr.line_to(self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - e1) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/4)
-					if (config['format'] == 'js'):
-						paper += "				%s_lines[%s].animate({path:'M %s %s L %s %s'},%s_delay);\n" % (self.RAPHAEL_SURFACE_NAME, lineCount, self.X_MARGIN + self.sWidth + self.SPACE_WIDTH + self.startMaxLabelWidth + self.LINE_START_DELTA, self.Y_MARGIN + self.HEADER_SPACE + (self.highest - (s1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8,	self.width - self.X_MARGIN - self.eWidth - self.SPACE_WIDTH - self.endMaxLabelWidth - self.SPACE_WIDTH - self.LINE_START_DELTA,	self.Y_MARGIN + self.HEADER_SPACE + (self.highest - (e1)) * self.LINE_HEIGHT * (1/self.delta) - self.LINE_HEIGHT/8, self.RAPHAEL_SURFACE_NAME)
+					currDelta = min([ b - a for a, b in zip(keys, keys[1:]) ])
+				if (currDelta < self.delta): self.delta = currDelta
+		
+		if (self.ORDER == "ascending"):
+			for keys in self.columnKeys:
+				keys.reverse()
+		
+		self.startKeys = self.columnKeys[0]
+		self.endKeys = self.columnKeys[-1]
+	
+	def findExtremes(self):
+		
+		# we also need to find the absolute min & max values
+		# so we know how to scale the plots (keys are already sorted)
+		
+		self.lowest = min([ min(keys[0], keys[-1]) for keys in self.columnKeys ])
+		self.highest = max([ max(keys[0], keys[-1]) for keys in self.columnKeys ])
+		
+		if self.LOG_SCALE:
+			self.lowest = math.log(self.lowest)
+			self.highest = math.log(self.highest)
+		
+		self.delta = float(self.delta)
+		self.lowest = float(self.lowest)
+		self.highest = float(self.highest)
+		
+		# facets sharing a scale all use the range found across all of them
+		
+		if self.scale != None:
+			self.lowest = self.scale["lowest"]
+			self.highest = self.scale["highest"]
+			self.delta = self.scale["delta"]
+	
+	# incremental updates: addRow()/updateRow()/removeRow() keep the sorted
+	# unique keys of every period, the label groups & the smallest gap between
+	# neighbouring keys up to date one row at a time (a bisect into the sorted
+	# keys plus a lazily pruned heap of gaps) instead of re-sorting everything;
+	# refresh() then re-renders. rows are looked up by label, so labels have
+	# to be unique. results match reading the same rows (in row order) afresh
+	
+	def gapValue(self, v):
+		
+		if self.LOG_SCALE:
+			return(math.log(v))
+		
+		return(v)
+	
+	def track(self):
+		
+		# build the incremental structures from the rows read so far (a
+		# full O(n log n) pass, done once)
+		
+		self.rowIndex = {}
+		for i, lab in enumerate(self.labels):
+			if lab in self.rowIndex:
+				raise ValueError("incremental updates need unique labels ('%s' repeats)" % (lab))
+			self.rowIndex[lab] = i
+		
+		self.tracked = { "keys" : [], "counts" : [], "gaps" : [], "rows" : [] }
+		
+		for column in self.columns:
 			
-			lineCount += 1
+			counts = {}
+			for v in column:
+				counts[v] = counts.get(v, 0) + 1
 			
-			cr.stroke()
+			keys = sorted(counts)
+			gaps = [ (self.gapValue(b) - self.gapValue(a), a, b) for a, b in zip(keys, keys[1:]) ]
+			heapq.heapify(gaps)
+			
+			self.tracked["keys"].append(keys)
+			self.tracked["counts"].append(counts)
+			self.tracked["gaps"].append(gaps)
+		
+		# the row indices behind each start/end tie group, in the same (row)
+		# order as its labels, so a row's place in a group is a bisect away
+		
+		for column in (self.columns[0], self.columns[-1]):
+			rows = {}
+			for i, v in enumerate(column):
+				if v in rows:
+					rows[v].append(i)
+				else:
+					rows[v] = [ i ]
+			self.tracked["rows"].append(rows)
 		
-		cr.restore()
-		cr.show_page()
+		self.groupLabels()
+	
+	def insertKey(self, c, v):
 		
-		if (config['format'] == "png"):
-			surface.write_to_png(filename)
-		elif (config['format'] == 'js'):
-			
-			paper += """			}
-        </script>
-    </head>
-    <body>
-        <div id="%s"></div>
-    </body>
-</html>
-""" % (self.RAPHAEL_SURFACE_NAME)
-			with open(filename+".html", 'w') as f:
-				f.write(paper)
+		counts = self.tracked["counts"][c]
+		if v in counts:
+			counts[v] += 1
+			return
+		counts[v] = 1
 		
-		surface.finish()
+		keys = self.tracked["keys"][c]
+		gaps = self.tracked["gaps"][c]
+		
+		i = bisect.bisect_left(keys, v)
+		keys.insert(i, v)
+		
+		# the gap v splits goes stale (dropped when it surfaces in the heap)
+		
+		if (i > 0):
+			heapq.heappush(gaps, (self.gapValue(v) - self.gapValue(keys[i-1]), keys[i-1], v))
+		if (i + 1 < len(keys)):
+			heapq.heappush(gaps, (self.gapValue(keys[i+1]) - self.gapValue(v), v, keys[i+1]))
 	
-	def __init__(self, config):
+	def removeKey(self, c, v):
 		
-		# since some methods need these, make them local to the class
+		counts = self.tracked["counts"][c]
+		counts[v] -= 1
+		if counts[v]:
+			return
+		del counts[v]
 		
-		# height/width of page for extents calc (tmp surface)
-		self.TMP_W = 8.5 * 72
-		self.TMP_H = 11.0 * 72
+		keys = self.tracked["keys"][c]
+		gaps = self.tracked["gaps"][c]
 		
-		self.LABEL_FONT_FAMILY = config["label_font_family"]
-		self.LABEL_FONT_SIZE = float(config["label_font_size"])
+		i = bisect.bisect_left(keys, v)
+		del keys[i]
 		
-		self.LABEL_COLOR = config["label_color"]
-		self.VALUE_COLOR = config["value_color"]
-		self.BACKGROUND_COLOR = config["background_color"]
+		if (0 < i < len(keys)):
+			heapq.heappush(gaps, (self.gapValue(keys[i]) - self.gapValue(keys[i-1]), keys[i-1], keys[i]))
 		
-		if "header_font_family" in config:
-			self.HEADER_FONT_FAMILY = config["header_font_family"]
-			self.HEADER_FONT_SIZE = float(config["header_font_size"])
-			self.HEADER_COLOR = config["header_color"]
-		else:
-			self.HEADER_FONT_FAMILY = None
-			self.HEADER_FONT_SIZE = None
-			self.HEADER_COLOR = None
+		# stale gaps pile up with churn; rebuild the heap once they dominate
 		
-		self.SLOPE_COLOR = config["slope_color"]
+		if (len(gaps) > 2 * len(keys) + 16):
+			gaps[:] = [ (self.gapValue(b) - self.gapValue(a), a, b) for a, b in zip(keys, keys[1:]) ]
+			heapq.heapify(gaps)
+	
+	def smallestGap(self, c):
 		
-		if "slope_up_color" in config:
-			self.SLOPE_UP_COLOR = config["slope_up_color"]
-		else:
-			self.SLOPE_UP_COLOR = config["slope_color"]
+		# the smallest gap still between two neighbouring keys
 		
-		if "slope_down_color" in config:
-			self.SLOPE_DOWN_COLOR = config["slope_down_color"]
-		else:
-			self.SLOPE_DOWN_COLOR = config["slope_color"]
+		keys = self.tracked["keys"][c]
+		gaps = self.tracked["gaps"][c]
 		
-		self.X_MARGIN = float(config["x_margin"])
-		self.Y_MARGIN = float(config["y_margin"])
-		self.LINE_WIDTH = float(config["line_width"])
+		while gaps:
+			gap, lo, hi = gaps[0]
+			i = bisect.bisect_left(keys, lo)
+			if (i + 1 < len(keys)) and (keys[i] == lo) and (keys[i+1] == hi):
+				return(gap)
+			heapq.heappop(gaps)
 		
-		if "slope_length" in config:
-			self.SLOPE_LENGTH = float(config["slope_length"])
-		else:
-			self.SLOPE_LENGTH = 300
+		return(float("inf"))
+	
+	def joinGroup(self, groups, joined, value):
 		
-		if "round_precision" in config:
-			self.ROUND_PRECISION = int(config["round_precision"])
-		else:
-			self.ROUND_PRECISION = None
+		# re-join one group of tied labels (joinLabels() only joins up to
+		# "label_group_limit" of them)
 		
-		if "log_scale" in config:
-			self.LOG_SCALE = True
-		else:
-			self.LOG_SCALE = False
+		if value in groups:
+			joined[value] = self.joinLabels(groups[value])
+		elif value in joined:
+			del joined[value]
+	
+	def tieGroups(self, r):
 		
-		if "add_commas" in config:
-			self.ADD_COMMAS = True
-		else:
-			self.ADD_COMMAS = False
+		# (labels, row indices, joined labels, value) of row r's start & end groups
 		
-		if "raphael_surface_name" in config:
-			self.RAPHAEL_SURFACE_NAME = config["raphael_surface_name"]
-		else:
-			self.RAPHAEL_SURFACE_NAME = "surface"
-			
-		if "sort" in config:
-			self.ORDER = config["sort"]
+		return(((self.startGroups, self.tracked["rows"][0], self.starts, self.columns[0][r]),
+				(self.endGroups, self.tracked["rows"][1], self.ends, self.columns[-1][r])))
+	
+	def linkGroups(self, r):
+		
+		lab = self.labels[r]
+		
+		for groups, rows, joined, value in self.tieGroups(r):
+			if value in rows:
+				i = bisect.bisect_left(rows[value], r)
+				rows[value].insert(i, r)
+				groups[value].insert(i, lab)
+			else:
+				rows[value] = [ r ]
+				groups[value] = [ lab ]
+			self.joinGroup(groups, joined, value)
+	
+	def unlinkGroups(self, r):
+		
+		for groups, rows, joined, value in self.tieGroups(r):
+			i = bisect.bisect_left(rows[value], r)
+			del rows[value][i]
+			del groups[value][i]
+			if not rows[value]:
+				del rows[value]
+				del groups[value]
+			self.joinGroup(groups, joined, value)
+	
+	def linkRow(self, r):
+		
+		for c, column in enumerate(self.columns):
+			self.insertKey(c, column[r])
+		
+		self.linkGroups(r)
+	
+	def unlinkRow(self, r):
+		
+		for c, column in enumerate(self.columns):
+			self.removeKey(c, column[r])
+		
+		self.unlinkGroups(r)
+	
+	def rowValues(self, values):
+		
+		# one value per period, rounded the way readRows() does it
+		
+		if (len(values) != self.PERIODS):
+			raise ValueError("expected %d values, got %d" % (self.PERIODS, len(values)))
+		
+		values = [ float(v) for v in values ]
+		if self.ROUND_PRECISION != None:
+			values = [ round(v, self.ROUND_PRECISION) for v in values ]
+		
+		return(values)
+	
+	def addRow(self, label, values):
+		
+		if self.tracked is None:
+			self.track()
+		
+		if label in self.rowIndex:
+			raise ValueError("there's already a row labelled '%s'" % (label))
+		
+		values = self.rowValues(values)
+		
+		self.rowIndex[label] = len(self.labels)
+		self.labels.append(label)
+		for column, v in zip(self.columns, values):
+			column.append(v)
+		
+		self.linkRow(len(self.labels) - 1)
+	
+	def updateRow(self, label, values):
+		
+		if self.tracked is None:
+			self.track()
+		
+		values = self.rowValues(values)
+		
+		r = self.rowIndex[label]
+		self.unlinkRow(r)
+		for column, v in zip(self.columns, values):
+			column[r] = v
+		self.linkRow(r)
+	
+	def removeRow(self, label):
+		
+		# the last row moves into the hole, so only the tie groups holding
+		# the removed & moved rows change
+		
+		if self.tracked is None:
+			self.track()
+		
+		r = self.rowIndex[label]
+		self.unlinkRow(r)
+		del self.rowIndex[label]
+		
+		last = len(self.labels) - 1
+		
+		if (r != last):
+			moved = self.labels[last]
+			self.unlinkGroups(last)
+			self.labels[r] = moved
+			for column in self.columns:
+				column[r] = column[last]
+			self.rowIndex[moved] = r
+			self.linkGroups(r)
+		
+		self.labels.pop()
+		for column in self.columns:
+			column.pop()
+	
+	def refreshKeys(self):
+		
+		# what sortKeys() & findExtremes() work out, from the incremental
+		# structures: the (sorted) keys are already there, the extremes are
+		# their ends & the smallest gap is on top of each heap
+		
+		if self.tracked is None:
+			self.track()
+		
+		if not self.labels:
+			raise ValueError("no rows left to chart")
+		
+		ascending = self.tracked["keys"]
+		
+		self.delta = min([ self.smallestGap(c) for c in range(len(ascending)) ])
+		
+		if (self.ORDER == "ascending"):
+			self.columnKeys = [ keys[::-1] for keys in ascending ]
 		else:
-			self.ORDER = "descending"
+			self.columnKeys = [ list(keys) for keys in ascending ]
 		
-		self.SPACE_WIDTH = self.LABEL_FONT_SIZE / 2.0
-		self.LINE_HEIGHT = self.LABEL_FONT_SIZE + (self.LABEL_FONT_SIZE / 2.0)
-		self.LINE_START_DELTA = 1.5*self.SPACE_WIDTH
+		self.startKeys = self.columnKeys[0]
+		self.endKeys = self.columnKeys[-1]
 		
-		OUTPUT_FILE = config["output"] + "." + config["format"]
+		self.lowest = min([ keys[0] for keys in ascending ])
+		self.highest = max([ keys[-1] for keys in ascending ])
 		
-		# process the values & make the slopegraph
+		if self.LOG_SCALE:
+			self.lowest = math.log(self.lowest)
+			self.highest = math.log(self.highest)
 		
-		self.readCSV(config["input"])
-		self.sortKeys()
-		self.findExtremes()
-		self.calculateExtents(OUTPUT_FILE, config["format"], config["value_format_string"])
-		self.makeSlopegraph(OUTPUT_FILE, config)
-
-
-def main():
+		self.delta = float(self.delta)
+		self.lowest = float(self.lowest)
+		self.highest = float(self.highest)
 	
-	parser = argparse.ArgumentParser(description="Creates a slopegraph from a CSV source")
-	parser.add_argument("--config",required=True,
-					help="config file name to use for slopegraph creation",)
-	args = parser.parse_args()
+	def refresh(self, config, out=None):
+		
+		# re-render after add/update/removeRow() calls; returns the output name(s)
+		
+		OUTPUT_FILES = [ config.get("output", "slopegraph") + "." + fmt for fmt in formatList(config) ]
+		
+		self.refreshKeys()
+		self.calculateExtents()
+		self.makeSlopegraph(OUTPUT_FILES, config, out)
+		self.metrics.save()
+		
+		names = outputNames(config)
+		if isinstance(config["format"], list):
+			return(names)
+		
+		return(names[0])
+	
+	def labelTable(self):
+		
+		# format & measure every unique value (& label) once; calculateExtents()
+		# & computeLayout() both read from here. per period { value : (text,
+		# width) }, the entries shared between periods
+		
+		formatted = {}
+		self.valueTexts = []
+		
+		for keys in self.labelKeys:
+			texts = {}
+			for k in keys:
+				key = k if k else repr(k) # -0.0 == 0.0 but may format as "-0"
+				if key not in formatted:
+					txt = self.formatValue(k)
+					formatted[key] = (txt, self.textExtents(txt)[2])
+				texts[k] = formatted[key]
+			self.valueTexts.append(texts)
+		
+		self.startWidths = dict([ (k, self.textExtents(self.starts[k])[2]) for k in self.labelKeys[0] ])
+		self.endWidths = dict([ (k, self.textExtents(self.ends[k])[2]) for k in self.labelKeys[-1] ])
+	
+	def levelOfDetail(self):
+		
+		# with more than "detail_rows" rows only that many (the top ones by
+		# "detail_by") are drawn as lines & labelled; the rest are drawn as
+		# density bands (see densityBands()). labelKeys are the values that
+		# may get a label & labelPriority ranks them (0: the best row's)
+		
+		self.detailRows = None
+		self.labelKeys = self.columnKeys
+		
+		n = len(self.labels)
+		if (self.DETAIL_ROWS == None) or (n <= self.DETAIL_ROWS):
+			return
+		
+		first = self.columns[0]
+		last = self.columns[-1]
+		
+		# (nlargest() is stable: earlier rows win ties, as with "top_n")
+		
+		best = heapq.nlargest(self.DETAIL_ROWS, range(n), key=lambda r: rankRow(first[r], last[r], self.DETAIL_BY))
+		
+		self.labelPriority = [ {} for column in self.columns ]
+		for rank, r in enumerate(best):
+			for column, priority in zip(self.columns, self.labelPriority):
+				priority.setdefault(column[r], rank)
+		
+		self.detailRows = sorted(best)
+		self.labelKeys = [ [ k for k in keys if k in priority ] for keys, priority in zip(self.columnKeys, self.labelPriority) ]
 	
-	if args.config:
+	def calculateExtents(self):
 		
-		json_data = open(args.config)
-		config = json.load(json_data)
-		json_data.close()
+		self.levelOfDetail()
+		self.labelTable()
+		
+		# find the *real* maximum label width (not just based on number of chars)
+		
+		self.sWidth = max(self.startWidths.values())
+		self.eWidth = max(self.endWidths.values())
+		
+		# & the widest value in each period
+		
+		self.valueWidths = [ max([ width for txt, width in texts.values() ]) for texts in self.valueTexts ]
+		
+		# the value columns: [left, right] of each, with a slope between neighbours
+		
+		self.valueColumns = []
+		left = self.X_MARGIN + self.sWidth + self.SPACE_WIDTH
+		for w in self.valueWidths:
+			self.valueColumns.append((left, left + w))
+			left += w + self.SPACE_WIDTH + self.SLOPE_LENGTH
+		
+		self.width = self.valueColumns[-1][1] + self.SPACE_WIDTH + self.eWidth + self.SPACE_WIDTH + self.X_MARGIN
+		
+		# the plot area is sized by the number of labels (or "target_height"),
+		# never by the smallest gap between two values; "delta" is the old way
+		
+		slots = max([ len(keys) for keys in self.labelKeys ])
+		if self.scale != None:
+			slots = max(slots, self.scale["slots"])
+		# one distinct value per period leaves no gap to size by (delta is
+		# infinite), which would flatten every slope, & near-identical values
+		# can leave none at all (delta is 0, their logs being the same double)
+		
+		deltaHeight = 0.0
+		if (self.delta > 0):
+			deltaHeight = ((self.highest - self.lowest) / self.delta) * self.LINE_HEIGHT
+		
+		if (deltaHeight == 0) and (self.highest > self.lowest):
+			deltaHeight = 2 * slots * self.LINE_HEIGHT
+		
+		if (self.LABEL_PLACEMENT == "delta"):
+			self.plotHeight = deltaHeight
+		else:
+			target = self.TARGET_HEIGHT
+			if target == None:
+				target = min(deltaHeight, 2 * slots * self.LINE_HEIGHT)
+			self.plotHeight = max(target, (slots - 1) * self.LINE_HEIGHT)
+		
+		self.height = (self.Y_MARGIN * 2) + self.plotHeight
+		
+		self.HEADER_SPACE = 0.0
+		if (self.HEADER_FONT_FAMILY != None):
+			self.HEADER_SPACE = self.HEADER_FONT_SIZE + 2*self.LINE_HEIGHT
+			self.height += self.HEADER_SPACE
+		
+	
+	def computeLayout(self, config):
+		
+		# work out every coordinate the backends need in one pass; cairo,
+		# Raphael & Processing output only ever read from self.layout
+		
+		top = self.Y_MARGIN + self.HEADER_SPACE
+		
+		if (self.highest > self.lowest):
+			scale = self.plotHeight / (self.highest - self.lowest)
+		else:
+			scale = 0.0
+		
+		# y position of each unique value (logs taken once per value)
+		
+		values = set()
+		for keys in self.columnKeys:
+			values.update(keys)
+		values = list(values)
+		
+		if self.LOG_SCALE:
+			scaled = [ math.log(v) for v in values ]
+		else:
+			scaled = values
+		
+		if (self.ORDER == "ascending"):
+			ys = [ top + (v - self.lowest) * scale for v in scaled ]
+		else:
+			ys = [ top + (self.highest - v) * scale for v in scaled ]
+		
+		yPos = dict(zip(values, ys))
+		
+		# at a level of detail lines stay at their values' own positions &
+		# labels that don't fit there are left out (rather than moved)
+		
+		if self.detailRows is None:
+			columnY = [ self.placeLabels(keys, yPos, top) for keys in self.columnKeys ]
+			labelled = self.columnKeys
+			rows = range(len(self.labels))
+		else:
+			columnY = [ yPos for keys in self.columnKeys ]
+			labelled = [ self.fitLabels(keys, yPos, priority) for keys, priority in zip(self.labelKeys, self.labelPriority) ]
+			rows = self.detailRows
+		
+		# x positions of the columns (text "x" is the anchor point): labels &
+		# values hug the slopes on the outer columns, inner values are centred
+		
+		startLabelX = self.X_MARGIN + self.sWidth
+		endLabelX = self.valueColumns[-1][1] + self.SPACE_WIDTH
+		
+		last = len(self.valueColumns) - 1
+		valueAnchors = []
+		for c, (left, right) in enumerate(self.valueColumns):
+			if (c == 0):
+				valueAnchors.append((right, "end"))
+			elif (c == last):
+				valueAnchors.append((left, "start"))
+			else:
+				valueAnchors.append(((left + right) / 2.0, "middle"))
+		
+		headers = []
+		if (self.HEADER_FONT_FAMILY != None):
+			headerAnchors = [ (startLabelX, "end") ] + valueAnchors[1:-1] + [ (endLabelX, "start") ]
+			for text, (x, anchor) in zip(config["labels"], headerAnchors):
+				xbearing, ybearing, hWidth, hHeight, xadvance, yadvance = (self.textExtents(text, self.HEADER_FONT_FAMILY, self.HEADER_FONT_SIZE, FONT_WEIGHT_BOLD))
+				headers.append({ "text" : text, "x" : x, "y" : self.Y_MARGIN + self.HEADER_FONT_SIZE, "width" : hWidth, "anchor" : anchor, "style" : "header" })
+		
+		texts = []
+		
+		for c, keys in enumerate(labelled):
+			
+			(x, anchor) = valueAnchors[c]
+			
+			for k in keys:
+				y = columnY[c][k]
+				txt, width = self.valueTexts[c][k]
+				if (c == 0):
+					texts.append({ "text" : self.starts[k], "x" : startLabelX, "y" : y, "width" : self.startWidths[k], "anchor" : "end", "style" : "label" })
+				texts.append({ "text" : txt, "x" : x, "y" : y, "width" : width, "anchor" : anchor, "style" : "value" })
+				if (c == last):
+					texts.append({ "text" : self.ends[k], "x" : endLabelX, "y" : y, "width" : self.endWidths[k], "anchor" : "start", "style" : "label" })
+		
+		# each row is one polyline: a segment per pair of neighbouring periods,
+		# between the (placed) value baselines. "points" holds the segments'
+		# endpoints (x1, y1, x2, y2, ...); each backend nudges them up to line
+		# up with its own idea of where text sits
+		
+		segments = []
+		for c in range(last):
+			segments.append((self.valueColumns[c][1] + self.LINE_START_DELTA, self.valueColumns[c+1][0] - self.LINE_START_DELTA))
+		
+		lines = []
+		if self.detailRows is not None:
+			lines = self.densityBands(yPos, top, segments)
+		
+		for r in rows:
+			
+			vals = [ column[r] for column in self.columns ]
+			
+			slope_val = vals[-1] - vals[0]
+			if (self.ORDER == "ascending"):
+				slope_val = -slope_val
+			
+			if (slope_val > 0):
+				cls = "up"
+			elif (slope_val < 0):
+				cls = "down"
+			else:
+				cls = "flat"
+			
+			points = []
+			for c, (x1, x2) in enumerate(segments):
+				points.extend((x1, columnY[c][vals[c]], x2, columnY[c+1][vals[c+1]]))
+			
+			lines.append({ "points" : points, "cls" : cls })
+		
+		self.layout = { "width" : self.width, "height" : self.height, "headers" : headers, "texts" : texts, "lines" : lines }
+	
+	def placeLabels(self, keys, yPos, top):
+		
+		# resolve label collisions on one side of the chart; the "delta"
+		# layout is spaced out far enough already
+		
+		if (self.LABEL_PLACEMENT == "delta"):
+			return(yPos)
+		
+		order = sorted(keys, key=yPos.get)
+		placed = packPositions([ yPos[k] for k in order ], self.LINE_HEIGHT, top, top + self.plotHeight)
+		
+		return(dict(zip(order, placed)))
+	
+	def fitLabels(self, keys, yPos, priority):
+		
+		# the keys (in order) whose labels fit: best rows first, skipping any
+		# label closer than a line to one already kept
+		
+		keptY = []
+		fits = set()
+		
+		for k in sorted(keys, key=priority.get):
+			y = yPos[k]
+			i = bisect.bisect(keptY, y)
+			if ((i > 0) and (y - keptY[i-1] < self.LINE_HEIGHT)) or ((i < len(keptY)) and (keptY[i] - y < self.LINE_HEIGHT)):
+				continue
+			keptY.insert(i, y)
+			fits.add(k)
+		
+		return([ k for k in keys if k in fits ])
+	
+	def densityBands(self, yPos, top, segments):
+		
+		# the rows not drawn in full, counted per (bin, bin) pair of
+		# "density_bins" bins down the plot for every pair of neighbouring
+		# periods; each pair is one line between the bins' middles with an
+		# "alpha" (log scaled, in 1/16ths) for how many rows it stands for
+		
+		bins = self.DENSITY_BINS
+		binHeight = self.plotHeight / bins
+		
+		binOf = {}
+		for v, y in yPos.items():
+			b = 0
+			if (binHeight > 0):
+				b = int((y - top) / binHeight)
+			binOf[v] = min(max(b, 0), bins - 1)
+		
+		counts = []
+		for c in range(len(segments)):
+			left = self.columns[c]
+			right = self.columns[c+1]
+			pairs = collections.Counter(zip(map(binOf.__getitem__, left), map(binOf.__getitem__, right)))
+			for r in self.detailRows:
+				pairs[(binOf[left[r]], binOf[right[r]])] -= 1
+			counts.append(pairs)
+		
+		most = max([ max(pairs.values()) for pairs in counts ])
+		
+		bands = []
+		for (x1, x2), pairs in zip(segments, counts):
+			for (b1, b2), count in sorted(pairs.items()):
+				
+				if (count <= 0):
+					continue
+				
+				if (b2 < b1):
+					cls = "up"
+				elif (b2 > b1):
+					cls = "down"
+				else:
+					cls = "flat"
+				
+				alpha = max(1, int(round(16 * math.log1p(count) / math.log1p(most)))) / 16.0
+				bands.append({ "points" : [ x1, top + (b1 + 0.5) * binHeight, x2, top + (b2 + 0.5) * binHeight ], "cls" : cls, "alpha" : alpha })
+		
+		return(bands)
+	
+	def formatValue(self, val):
+		
+		txt = self.VALUE_FORMAT_STRING % (val)
+		txt = txt.strip()
+		if self.ADD_COMMAS:
+			tSep, dSep, grouping = self.NUMBER_FORMAT
+			txt = splitThousands(txt, tSep, dSep, grouping)
+		
+		return(txt)
+	
+	def textLeft(self, t):
+		
+		if (t["anchor"] == "end"):
+			return(t["x"] - t["width"])
+		elif (t["anchor"] == "middle"):
+			return(t["x"] - t["width"] / 2.0)
+		
+		return(t["x"])
+	
+	def drawCairo(self, cr):
+		
+		layout = self.layout
+		
+		textColors = { "label" : hexColor(self.LABEL_COLOR), "value" : hexColor(self.VALUE_COLOR) }
+		lineColors = { "up" : hexColor(self.SLOPE_UP_COLOR), "down" : hexColor(self.SLOPE_DOWN_COLOR), "flat" : hexColor(self.SLOPE_COLOR) }
+		
+		cr.save()
+		
+		cr.set_font_options(self.fontOptions)
+		cr.set_line_width(self.LINE_WIDTH)
+		
+		if (self.BACKGROUND_COLOR != "transparent"):
+			cr.set_source_rgb(*hexColor(self.BACKGROUND_COLOR))
+			cr.rectangle(0,0,layout["width"],layout["height"])
+			cr.fill()
+		
+		# draw headers (if present)
+		
+		if layout["headers"]:
+			
+			cr.save()
+			
+			cr.set_font_face(self.fontFace(self.HEADER_FONT_FAMILY, FONT_WEIGHT_BOLD))
+			cr.set_font_size(self.HEADER_FONT_SIZE)
+			cr.set_source_rgb(*hexColor(self.HEADER_COLOR))
+			
+			for t in layout["headers"]:
+				cr.move_to(self.textLeft(t), t["y"])
+				cr.show_text(t["text"])
+			
+			cr.restore()
+		
+		# draw labels & values at the correct positions, one colour at a
+		# time so the colour is only set once per run of text
+		
+		cr.set_font_face(self.fontFace(self.LABEL_FONT_FAMILY, FONT_WEIGHT_NORMAL))
+		cr.set_font_size(self.LABEL_FONT_SIZE)
+		
+		textRuns = { "label" : [], "value" : [] }
+		for t in layout["texts"]:
+			textRuns[t["style"]].append(t)
+		
+		for style in ("label", "value"):
+			if textRuns[style]:
+				cr.set_source_rgb(*textColors[style])
+				for t in textRuns[style]:
+					cr.move_to(self.textLeft(t), t["y"])
+					cr.show_text(t["text"])
+		
+		# draw lines: one compound path (& one stroke) per colour class
+		# rather than a colour change & stroke for every row; density bands
+		# (lines with an "alpha") go underneath, a stroke per class & alpha
+		
+		lineRuns = { "up" : [], "down" : [], "flat" : [] }
+		bandRuns = {}
+		for l in layout["lines"]:
+			if "alpha" in l:
+				bandRuns.setdefault((l["alpha"], l["cls"]), []).append(l["points"])
+			else:
+				lineRuns[l["cls"]].append(l["points"])
+		
+		for alpha, cls in sorted(bandRuns):
+			cr.set_source_rgba(*(lineColors[cls] + (alpha,)))
+			for p in bandRuns[(alpha, cls)]:
+				for i in range(0, len(p), 4):
+					cr.move_to(p[i], p[i+1] - self.LINE_HEIGHT/4)
+					cr.line_to(p[i+2], p[i+3] - self.LINE_HEIGHT/4)
+			cr.stroke()
+			self.strokes += 1
+		
+		for cls in ("up", "down", "flat"):
+			if lineRuns[cls]:
+				cr.set_source_rgb(*lineColors[cls])
+				for p in lineRuns[cls]:
+					for i in range(0, len(p), 4):
+						cr.move_to(p[i], p[i+1] - self.LINE_HEIGHT/4)
+						cr.line_to(p[i+2], p[i+3] - self.LINE_HEIGHT/4)
+				cr.stroke()
+				self.strokes += 1
+		
+		cr.restore()
+	
+	def raphaelHTML(self):
+		
+		# the chart goes out as one compact JSON data block (coordinates, text
+		# & indexes into shared font/colour/anchor tables) plus a small fixed
+		# loop that builds the Raphael elements; yielded piece by piece so it can
+		# be streamed out as it is generated
+		
+		layout = self.layout
+		name = self.RAPHAEL_SURFACE_NAME
+		
+		colors = [ self.LABEL_COLOR, self.VALUE_COLOR, self.SLOPE_UP_COLOR, self.SLOPE_DOWN_COLOR, self.SLOPE_COLOR, self.HEADER_COLOR ]
+		textColors = { "label" : 0, "value" : 1, "header" : 5 }
+		lineColors = { "up" : 2, "down" : 3, "flat" : 4 }
+		anchors = [ "start", "middle", "end" ]
+		
+		fonts = [ [ self.LABEL_FONT_FAMILY, "normal", self.LABEL_FONT_SIZE ] ]
+		if layout["headers"]:
+			fonts.append([ self.HEADER_FONT_FAMILY, "bold", self.HEADER_FONT_SIZE ])
+		
+		background = None
+		if (self.BACKGROUND_COLOR != "transparent"):
+			background = "#" + self.BACKGROUND_COLOR
+		
+		# density bands get their own (translucent) colours
+		
+		css = [ "#" + c if c else None for c in colors ]
+		bandColors = {}
+		for l in layout["lines"]:
+			if ("alpha" in l) and ((l["cls"], l["alpha"]) not in bandColors):
+				bandColors[(l["cls"], l["alpha"])] = len(css)
+				r, g, b = [ int(v, 16) for v in split(colors[lineColors[l["cls"]]], 2) ]
+				css.append("rgba(%d,%d,%d,%s)" % (r, g, b, l["alpha"]))
+		
+		def js(obj):
+			# JSON is valid javascript; just keep "</script>" out of it
+			return(json.dumps(obj, separators=(',', ':')).replace("</", "<\\/"))
+		
+		def coord(v):
+			return(round(v, 2))
+		
+		
+		yield("""<html>
+   <head>
+        <title></title>
+        <script type="text/javascript" src="raphael-min.js"></script>
+        <style type="text/css">
+            #%s {
+                width: %d;
+            }
+        </style>
+        <script>
+""" % (name, layout["width"]))
+		
+		yield("var %s_data = {\"width\":%s,\"height\":%s,\"background\":%s,\"delay\":1000,\"lineWidth\":%s,\"offset\":%s,\"fonts\":%s,\"colors\":%s,\"anchors\":%s,\n\"texts\":[" % (name, js(layout["width"]), js(layout["height"]), js(background), js(self.LINE_WIDTH), js(self.LINE_HEIGHT/8), js(fonts), js(css), js(anchors)))
+		
+		sep = "\n"
+		for t in layout["headers"]:
+			yield(sep + js([ coord(t["x"]), coord(t["y"]), t["text"], 1, textColors["header"], anchors.index(t["anchor"]) ]))
+			sep = ",\n"
+		for t in layout["texts"]:
+			yield(sep + js([ coord(t["x"]), coord(t["y"]), t["text"], 0, textColors[t["style"]], anchors.index(t["anchor"]) ]))
+			sep = ",\n"
+		
+		yield("],\n\"lines\":[")
+		
+		sep = "\n"
+		for l in layout["lines"]:
+			if "alpha" in l:
+				color = bandColors[(l["cls"], l["alpha"])]
+			else:
+				color = lineColors[l["cls"]]
+			yield(sep + js([ color ] + [ coord(v) for v in l["points"] ]))
+			sep = ",\n"
+		
+		yield("]};\n")
+		
+		yield("""			window.onload = function() {
+				
+				var d = %s_data, i, j;
+				var %s = new Raphael(document.getElementById('%s'), d.width, d.height);
+				var %s_delay = d.delay;
+				var %s_headers = new Array();
+				var %s_lines = new Array();
+				
+				if (d.background) %s.rect(0, 0, d.width, d.height).attr({fill:d.background, stroke:d.background});
+				
+				for (i = 0; i < d.texts.length; i++) {
+					var t = d.texts[i], font = d.fonts[t[3]];
+					var e = %s.text(t[0], t[1], t[2]).attr({'font':font[2] + 'px ' + font[0], 'font-family':font[0], 'font-size':font[2], 'font-weight':font[1], 'fill':d.colors[t[4]], 'text-anchor':d.anchors[t[5]]});
+					if (t[3] == 1) %s_headers.push(e);
+				}
+				
+				for (i = 0; i < d.lines.length; i++) {
+					var l = d.lines[i], from = '', to = '';
+					for (j = 1; j < l.length; j += 4) {
+						from += 'M' + l[j] + ' 0L' + l[j+2] + ' 0';
+						to += 'M' + l[j] + ' ' + (l[j+1] - d.offset) + 'L' + l[j+2] + ' ' + (l[j+3] - d.offset);
+					}
+					%s_lines[i] = %s.path(from).attr({'stroke-width':d.lineWidth, stroke:d.colors[l[0]]});
+					%s_lines[i].animate({path:to}, %s_delay);
+				}
+			}
+        </script>
+    </head>
+    <body>
+        <div id="%s"></div>
+    </body>
+</html>
+""" % (name, name, name, name, name, name, name, name, name, name, name, name, name, name))
+	
+	def processingSketch(self):
+		
+		# Processing sketch; like cairo, text "y" is the baseline
+		
+		layout = self.layout
+		
+		lineColors = { "up" : self.SLOPE_UP_COLOR, "down" : self.SLOPE_DOWN_COLOR, "flat" : self.SLOPE_COLOR }
+		textColors = { "header" : self.HEADER_COLOR, "label" : self.LABEL_COLOR, "value" : self.VALUE_COLOR }
+		aligns = { "start" : "LEFT", "end" : "RIGHT", "middle" : "CENTER" }
+		
+		yield("""void setup()
+{
+	size(%d,%d);
+""" % (layout["width"], layout["height"]))
+		
+		if (self.BACKGROUND_COLOR != "transparent"):
+			yield("	background(#%s);\n" % (self.BACKGROUND_COLOR))
+		
+		if layout["headers"]:
+			yield("	textFont(createFont(\"%s Bold\", %s));\n" % (self.HEADER_FONT_FAMILY, self.HEADER_FONT_SIZE))
+			for t in layout["headers"]:
+				yield("	fill(#%s); textAlign(%s); text(\"%s\", %s, %s);\n" % (textColors["header"], aligns[t["anchor"]], pdeString(t["text"]), t["x"], t["y"]))
+		
+		yield("	textFont(createFont(\"%s\", %s));\n" % (self.LABEL_FONT_FAMILY, self.LABEL_FONT_SIZE))
+		for t in layout["texts"]:
+			yield("	fill(#%s); textAlign(%s); text(\"%s\", %s, %s);\n" % (textColors[t["style"]], aligns[t["anchor"]], pdeString(t["text"]), t["x"], t["y"]))
+		
+		yield("	strokeWeight(%s);\n" % (self.LINE_WIDTH))
+		for l in layout["lines"]:
+			p = l["points"]
+			if "alpha" in l:
+				yield("	stroke(#%s, %d);\n" % (lineColors[l["cls"]], round(l["alpha"] * 255)))
+			else:
+				yield("	stroke(#%s);\n" % (lineColors[l["cls"]]))
+			for i in range(0, len(p), 4):
+				yield("	line(%s, %s, %s, %s);\n" % (p[i], p[i+1] - self.LINE_HEIGHT/4, p[i+2], p[i+3] - self.LINE_HEIGHT/4))
+		
+		yield("}\n")
+	
+	def layoutJSON(self):
+		
+		# the computed geometry (& the styles to draw it with) as JSON, for
+		# drawing elsewhere. text "y" & line points are baselines, as in
+		# self.layout; fonts are [ family, weight, size ]
+		
+		layout = self.layout
+		
+		fonts = { "label" : [ self.LABEL_FONT_FAMILY, "normal", self.LABEL_FONT_SIZE ] }
+		if layout["headers"]:
+			fonts["header"] = [ self.HEADER_FONT_FAMILY, "bold", self.HEADER_FONT_SIZE ]
+		
+		colors = { "background" : self.BACKGROUND_COLOR, "header" : self.HEADER_COLOR, "label" : self.LABEL_COLOR,
+					"value" : self.VALUE_COLOR, "up" : self.SLOPE_UP_COLOR, "down" : self.SLOPE_DOWN_COLOR, "flat" : self.SLOPE_COLOR }
+		
+		yield(json.dumps({ "version" : __version__, "width" : layout["width"], "height" : layout["height"],
+							"line_width" : self.LINE_WIDTH, "line_height" : self.LINE_HEIGHT, "font_metrics" : self.FONT_METRICS,
+							"fonts" : fonts, "colors" : colors, "headers" : layout["headers"], "texts" : layout["texts"],
+							"lines" : layout["lines"] }, sort_keys=True, separators=(',', ':')))
+		yield("\n")
+	
+	def writeText(self, chunks, filename, out=None):
+		
+		# text formats go to "filename" unless a (binary) file object is given
+		
+		if out is None:
+			with open(filename, 'w') as f:
+				for chunk in chunks:
+					f.write(chunk)
+			return
+		
+		for chunk in chunks:
+			if not isinstance(chunk, bytes):
+				chunk = chunk.encode("utf-8")
+			out.write(chunk)
+	
+	def writeBandedPNG(self, target, recording=None):
+		
+		# rasterize the chart one horizontal band at a time (into a single
+		# reused band-sized surface) & stream each band's rows through zlib
+		# into the PNG, so memory is bounded by the band, not the image
+		
+		width = int(self.width * self.PNG_SCALE)
+		height = int(self.height * self.PNG_SCALE)
+		
+		band = self.PNG_BAND_HEIGHT
+		if band == None:
+			band = 1024
+		band = max(1, min(band, height))
+		
+		if (recording is None) and hasattr(cairo, "RecordingSurface"):
+			recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, (0, 0, self.width, self.height))
+			self.drawCairo(cairo.Context(recording))
+		
+		opaque = (self.BACKGROUND_COLOR != "transparent")
+		if opaque:
+			surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, band)
+		else:
+			surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, band)
+		
+		if hasattr(target, "write"):
+			f = target
+		else:
+			f = open(target, "wb")
+		
+		try:
+			
+			f.write(b"\x89PNG\r\n\x1a\n")
+			f.write(pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, opaque and 2 or 6, 0, 0, 0)))
+			
+			compressor = zlib.compressobj(6)
+			
+			for top in range(0, height, band):
+				
+				rows = min(band, height - top)
+				
+				cr = cairo.Context(surface)
+				cr.set_operator(cairo.OPERATOR_CLEAR)
+				cr.paint()
+				cr.set_operator(cairo.OPERATOR_OVER)
+				
+				cr.translate(0, -top)
+				cr.scale(self.PNG_SCALE, self.PNG_SCALE)
+				
+				if recording is None:
+					self.drawCairo(cr)
+				else:
+					cr.set_source_surface(recording, 0, 0)
+					cr.paint()
+				
+				surface.flush()
+				
+				data = bytearray(surface.get_data())
+				stride = surface.get_stride()
+				
+				raw = bytearray()
+				for y in range(rows):
+					raw += b"\0" # no filter
+					raw += pngPixels(data[y*stride:y*stride + width*4], opaque)
+				
+				chunk = compressor.compress(bytes(raw))
+				if chunk:
+					f.write(pngChunk(b"IDAT", chunk))
+			
+			f.write(pngChunk(b"IDAT", compressor.flush()))
+			f.write(pngChunk(b"IEND", b""))
+		
+		finally:
+			if f is not target:
+				f.close()
+		
+		surface.finish()
+	
+	def pinCreationDate(self, surface):
+		
+		# PDF metadata needs cairo 1.16+; older ones just stamp "now"
+		
+		if hasattr(cairo, "PDFMetadata") and hasattr(surface, "set_metadata"):
+			surface.set_metadata(cairo.PDFMetadata.CREATE_DATE, CREATION_DATE)
+	
+	def pinPSCreationDate(self, data):
+		
+		# cairo always stamps PostScript with "now" (there's no metadata
+		# call for it), so the DSC header line is rewritten instead
+		
+		return(re.sub(br"(?m)^%%CreationDate:[^\n]*", b"%%CreationDate: (" + CREATION_DATE.encode("ascii") + b")", data, count=1))
+	
+	def tick(self, phase):
+		
+		# lap timer behind --stats: charges the time since the last tick to
+		# "phase"; a no-op unless a stats hook was given
+		
+		if self.stats is None:
+			return
+		
+		now = clock()
+		phases = self.stats["phases"]
+		phases[phase] = phases.get(phase, 0.0) + (now - self.lapStart)
+		self.lapStart = now
+	
+	def makeSlopegraph(self, filename, config, out=None):
+		
+		# config["format"] may be one format or a list of them; "filename" (&
+		# "out", an optional binary file object to write to instead) is then
+		# one name (file object) or a list with one per format. the layout
+		# is only computed once & when there are several cairo formats the
+		# chart is drawn once onto a recording surface each of them replays
+		
+		formats = formatList(config)
+		
+		filenames = filename
+		if not isinstance(filenames, list):
+			filenames = [ filenames ] * len(formats)
+		
+		outs = out
+		if not isinstance(outs, list):
+			if (out is not None) and (len(formats) > 1):
+				raise ValueError("several formats need one output file object each")
+			outs = [ out ] * len(formats)
+		
+		self.computeLayout(config)
+		self.tick("layout")
+		
+		self.writeLayout(filenames, config, outs)
+	
+	def writeLayout(self, filenames, config, outs):
+		
+		# write self.layout in every format (one file name/object per format)
+		
+		formats = formatList(config)
+		
+		cairoFormats = [ f for f in formats if f not in ("js", "pde", "layout") ]
+		if cairoFormats:
+			self.useCairo()
+		
+		recording = None
+		if (len(cairoFormats) > 1) and hasattr(cairo, "RecordingSurface"):
+			recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, (0, 0, self.width, self.height))
+			self.drawCairo(cairo.Context(recording))
+			self.tick("draw")
+		
+		for fmt, name, target in zip(formats, filenames, outs):
+			self.writeFormat(fmt, name, target, recording)
+	
+	def writeFormat(self, fmt, filename, out=None, recording=None):
+		
+		# write the laid out chart in one format; cairo formats replay
+		# "recording" (a RecordingSurface of the chart) when given
+		
+		if (fmt == "js"):
+			self.writeText(self.raphaelHTML(), filename+".html", out)
+			self.tick("write")
+			return
+		elif (fmt == "pde"):
+			self.writeText(self.processingSketch(), filename, out)
+			self.tick("write")
+			return
+		elif (fmt == "layout"):
+			self.writeText(self.layoutJSON(), filename+".json", out)
+			self.tick("write")
+			return
+		
+		self.useCairo()
+		
+		target = filename
+		if out is not None:
+			target = out
+		
+		if (fmt == "pdf"):
+			surface = cairo.PDFSurface (target, self.width, self.height)
+			self.pinCreationDate(surface)
+		elif (fmt == "ps"):
+			psTarget = target
+			target = io.BytesIO() # so the creation date can be pinned
+			surface = cairo.PSSurface(target, self.width, self.height)
+			surface.set_eps(True)
+		elif (fmt == "svg"):
+			surface = cairo.SVGSurface (target, self.width, self.height)
+		elif (fmt == "png"):
+			# bands only split the height; cairo can't make a wider image
+			if (int(self.width * self.PNG_SCALE) > MAX_IMAGE_SIZE):
+				raise ValueError("a %d pixel wide PNG is more than the %d cairo can make; lower \"dpi\" or \"slope_length\" (or use svg/pdf)"
+								% (int(self.width * self.PNG_SCALE), MAX_IMAGE_SIZE))
+			if (self.PNG_BAND_HEIGHT != None) or (self.height * self.PNG_SCALE > MAX_IMAGE_SIZE):
+				self.writeBandedPNG(target, recording)
+				self.tick("finish")
+				return
+			surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, int(self.width * self.PNG_SCALE), int(self.height * self.PNG_SCALE))
+		else:
+			surface = cairo.PDFSurface (target, self.width, self.height)
+			self.pinCreationDate(surface)
+		
+		cr = cairo.Context(surface)
+		
+		if (fmt == "png") and (self.PNG_SCALE != 1.0):
+			cr.scale(self.PNG_SCALE, self.PNG_SCALE)
+		
+		if recording is None:
+			self.drawCairo(cr)
+		else:
+			cr.set_source_surface(recording, 0, 0)
+			cr.paint()
+		
+		cr.show_page()
+		self.tick("draw")
+		
+		if (fmt == "png"):
+			surface.write_to_png(target)
+		
+		surface.finish()
+		
+		if (fmt == "ps"):
+			data = self.pinPSCreationDate(target.getvalue())
+			if out is None:
+				with open(psTarget, 'wb') as f:
+					f.write(data)
+			else:
+				out.write(data)
+		
+		self.tick("finish")
+	
+	def configure(self, config):
+		
+		# since some methods need these, make them local to the class
+		
+		self.LABEL_FONT_FAMILY = config["label_font_family"]
+		self.LABEL_FONT_SIZE = float(config["label_font_size"])
+		
+		self.LABEL_COLOR = config["label_color"]
+		self.VALUE_COLOR = config["value_color"]
+		self.BACKGROUND_COLOR = config["background_color"]
+		
+		if "header_font_family" in config:
+			self.HEADER_FONT_FAMILY = config["header_font_family"]
+			self.HEADER_FONT_SIZE = float(config["header_font_size"])
+			self.HEADER_COLOR = config["header_color"]
+		else:
+			self.HEADER_FONT_FAMILY = None
+			self.HEADER_FONT_SIZE = None
+			self.HEADER_COLOR = None
+		
+		self.SLOPE_COLOR = config["slope_color"]
+		
+		if "slope_up_color" in config:
+			self.SLOPE_UP_COLOR = config["slope_up_color"]
+		else:
+			self.SLOPE_UP_COLOR = config["slope_color"]
+		
+		if "slope_down_color" in config:
+			self.SLOPE_DOWN_COLOR = config["slope_down_color"]
+		else:
+			self.SLOPE_DOWN_COLOR = config["slope_color"]
+		
+		self.X_MARGIN = float(config["x_margin"])
+		self.Y_MARGIN = float(config["y_margin"])
+		self.LINE_WIDTH = float(config["line_width"])
+		
+		if "slope_length" in config:
+			self.SLOPE_LENGTH = float(config["slope_length"])
+		else:
+			self.SLOPE_LENGTH = 300
+		
+		if "round_precision" in config:
+			self.ROUND_PRECISION = int(config["round_precision"])
+		else:
+			self.ROUND_PRECISION = None
+		
+		if "log_scale" in config:
+			self.LOG_SCALE = True
+		else:
+			self.LOG_SCALE = False
+		
+		if "add_commas" in config:
+			self.ADD_COMMAS = True
+		else:
+			self.ADD_COMMAS = False
+		
+		# "add_commas" groups with "," every 3 digits (& a "." decimal point)
+		# or the way "number_locale" (e.g. "de_DE.UTF-8"; "" for the one in
+		# the environment) does
+		
+		if "number_locale" in config:
+			self.NUMBER_FORMAT = numberFormat(config["number_locale"])
+		else:
+			self.NUMBER_FORMAT = (",", ".", (3, 0))
+		
+		if "raphael_surface_name" in config:
+			self.RAPHAEL_SURFACE_NAME = config["raphael_surface_name"]
+		else:
+			self.RAPHAEL_SURFACE_NAME = "surface"
+			
+		if "sort" in config:
+			self.ORDER = config["sort"]
+		else:
+			self.ORDER = "descending"
+		
+		if "label_group_limit" in config:
+			self.LABEL_GROUP_LIMIT = int(config["label_group_limit"])
+		else:
+			self.LABEL_GROUP_LIMIT = None
+		
+		if "header" in config:
+			if config["header"] in (False, "false", "no"):
+				self.CSV_HEADER = False
+			elif (config["header"] == "auto"):
+				self.CSV_HEADER = "auto"
+			else:
+				self.CSV_HEADER = True
+		else:
+			self.CSV_HEADER = False
+		
+		# the # of periods: an explicit "periods", else one per value column
+		# picked in "columns", else one per header in "labels", else 2
+		
+		if "periods" in config:
+			self.PERIODS = int(config["periods"])
+		elif "columns" in config:
+			self.PERIODS = len(config["columns"]) - 1
+		elif ("labels" in config) and (len(config["labels"]) >= 2):
+			self.PERIODS = len(config["labels"])
+		else:
+			self.PERIODS = 2
+		
+		if "columns" in config:
+			self.CSV_COLUMNS = config["columns"]
+		else:
+			self.CSV_COLUMNS = list(range(self.PERIODS + 1))
+		
+		if "include_labels" in config:
+			self.INCLUDE_LABELS = config["include_labels"]
+		else:
+			self.INCLUDE_LABELS = None
+		
+		if "top_n" in config:
+			self.TOP_N = int(config["top_n"])
+		else:
+			self.TOP_N = None
+		
+		if "top_by" in config:
+			self.TOP_BY = config["top_by"]
+		else:
+			self.TOP_BY = "abs_change"
+		
+		# numeric reading (& sorting) with numpy: "auto" (when it's installed,
+		# for VECTOR_MIN_ROWS rows or more), "yes" (when installed) or "no";
+		# either way the chart is the same
+		
+		if "vectorize" in config:
+			self.VECTORIZE = { True : "yes", False : "no" }.get(config["vectorize"], config["vectorize"])
+		else:
+			self.VECTORIZE = "auto"
+		
+		if self.VECTORIZE not in ("auto", "yes", "no"):
+			raise ValueError("vectorize must be 'auto', 'yes' or 'no', not '%s'" % (self.VECTORIZE))
+		
+		# level of detail for very many rows: only the top "detail_rows" (by
+		# "detail_by", as "top_by") are drawn in full, the rest as density
+		# bands across "density_bins" bins
+		
+		if "detail_rows" in config:
+			self.DETAIL_ROWS = int(config["detail_rows"])
+		else:
+			self.DETAIL_ROWS = None
+		
+		if "detail_by" in config:
+			self.DETAIL_BY = config["detail_by"]
+		else:
+			self.DETAIL_BY = "abs_change"
+		
+		if "density_bins" in config:
+			self.DENSITY_BINS = int(config["density_bins"])
+		else:
+			self.DENSITY_BINS = 40
+		
+		if (self.DETAIL_ROWS != None) and (self.DETAIL_ROWS < 1):
+			raise ValueError("detail_rows must be at least 1, not %d" % (self.DETAIL_ROWS))
+		
+		if (self.DENSITY_BINS < 1):
+			raise ValueError("density_bins must be at least 1, not %d" % (self.DENSITY_BINS))
+		
+		if "facet_by" in config:
+			self.FACET_BY = config["facet_by"]
+		else:
+			self.FACET_BY = None
+		
+		if "facet_layout" in config:
+			self.FACET_LAYOUT = config["facet_layout"]
+		else:
+			self.FACET_LAYOUT = "files"
+		
+		if "facet_columns" in config:
+			self.FACET_COLUMNS = int(config["facet_columns"])
+		else:
+			self.FACET_COLUMNS = None
+		
+		if "facet_scales" in config:
+			self.FACET_SCALES = config["facet_scales"]
+		else:
+			self.FACET_SCALES = "free"
+		
+		if "facet_workers" in config:
+			self.FACET_WORKERS = int(config["facet_workers"])
+		else:
+			self.FACET_WORKERS = None
+		
+		# text is measured with cairo, or ("python") from font files given in
+		# "font_files" ({ "Family" : "x.ttf", "Family:bold" : "x-bold.afm" })
+		# or built-in Helvetica widths; "layout"-only output defaults to the
+		# latter so it never needs cairo
+		
+		if "font_metrics" in config:
+			self.FONT_METRICS = config["font_metrics"]
+		elif (config.get("format") in ("layout", [ "layout" ])):
+			self.FONT_METRICS = "python"
+		else:
+			self.FONT_METRICS = "cairo"
+		
+		if self.FONT_METRICS not in ("cairo", "python"):
+			raise ValueError("font_metrics must be 'cairo' or 'python', not '%s'" % (self.FONT_METRICS))
+		
+		if "font_files" in config:
+			self.FONT_FILES = config["font_files"]
+		else:
+			self.FONT_FILES = {}
+		
+		# PNG resolution (72 dpi is one pixel per point) & banded output:
+		# "png_band_height" rows of pixels are rasterized at a time (always
+		# the case when the image is too tall for one cairo surface)
+		
+		if "dpi" in config:
+			self.PNG_SCALE = float(config["dpi"]) / 72.0
+		else:
+			self.PNG_SCALE = 1.0
+		
+		if "png_band_height" in config:
+			self.PNG_BAND_HEIGHT = int(config["png_band_height"])
+		else:
+			self.PNG_BAND_HEIGHT = None
+		
+		if "label_placement" in config:
+			self.LABEL_PLACEMENT = config["label_placement"]
+		else:
+			self.LABEL_PLACEMENT = "packed"
+		
+		if self.LABEL_PLACEMENT not in ("packed", "delta"):
+			raise ValueError("label_placement must be 'packed' or 'delta', not '%s'" % (self.LABEL_PLACEMENT))
+		
+		if "target_height" in config:
+			self.TARGET_HEIGHT = float(config["target_height"])
+		else:
+			self.TARGET_HEIGHT = None
+		
+		# "metrics_cache" only switches a renderer's own cache; one passed in
+		# (shared, or set up by --metrics-cache) is left alone
+		
+		if self.ownMetrics and ("metrics_cache" in config) and (config["metrics_cache"] != self.metrics.filename):
+			self.metrics.save()
+			self.metrics = TextMetrics(self.metrics.size, config["metrics_cache"])
+		
+		self.SPACE_WIDTH = self.LABEL_FONT_SIZE / 2.0
+		self.LINE_HEIGHT = self.LABEL_FONT_SIZE + (self.LABEL_FONT_SIZE / 2.0)
+		self.LINE_START_DELTA = 1.5*self.SPACE_WIDTH
+		
+		self.VALUE_FORMAT_STRING = config["value_format_string"]
+	
+	def prepare(self, config, rows=None, scale=None):
+		
+		# everything short of the layout: read the rows (or the "input" CSV),
+		# group, sort, find the extremes & measure. "scale" (see
+		# sharedScale()) puts the chart on a value range shared with others
+		
+		self.configure(config)
+		self.reset()
+		self.scale = scale
+		self.tick("configure")
+		
+		self.metricsMark = (self.metrics.hits + self.metrics.misses, self.metrics.misses)
+		
+		if rows is None:
+			self.readCSV(config["input"])
+		else:
+			self.readRows(rows)
+		self.tick("read")
+		
+		self.analyse()
+	
+	def analyse(self):
+		
+		# group, sort, find the extremes & measure whatever has been read
+		
+		self.groupLabels()
+		self.tick("groupLabels")
+		self.sortKeys()
+		self.tick("sortKeys")
+		self.findExtremes()
+		self.tick("findExtremes")
+		self.calculateExtents()
+		self.tick("calculateExtents")
+	
+	def layoutChart(self, config, rows=None, scale=None):
+		
+		# lay one chart out without drawing it; returns self.layout
+		
+		self.prepare(config, rows, scale)
+		self.computeLayout(config)
+		
+		return(self.layout)
+	
+	def sharedScale(self, facets):
+		
+		# the value range (& # of label slots) covering every facet, so they
+		# can all be drawn to the same scale. only sorts, never measures
+		
+		self.scale = None
+		lowest, highest, delta, slots = [], [], [], []
+		
+		for rows in facets.values():
+			self.reset()
+			self.readRows(rows)
+			self.groupLabels()
+			self.sortKeys()
+			self.findExtremes()
+			lowest.append(self.lowest)
+			highest.append(self.highest)
+			self.levelOfDetail()
+			delta.append(self.delta)
+			slots.append(max([ len(keys) for keys in self.labelKeys ]))
+		
+		return({ "lowest" : min(lowest), "highest" : max(highest), "delta" : min(delta), "slots" : max(slots) })
+	
+	def renderFacets(self, config, out=None):
+		
+		# one slopegraph per value of the "facet_by" column, as separate
+		# files ("<output>-<facet>.<format>") or as a grid on one page.
+		# facets are laid out/rendered in parallel across worker processes
+		
+		self.configure(config)
+		self.tick("configure")
+		
+		if self.FACET_LAYOUT not in ("files", "grid"):
+			raise ValueError("facet_layout must be 'files' or 'grid', not '%s'" % (self.FACET_LAYOUT))
+		
+		if (self.FACET_LAYOUT == "files") and (out is not None):
+			raise ValueError("facet_layout 'files' can't write to a file object")
+		
+		facets = self.readFacets(config["input"])
+		self.tick("read")
+		
+		if not facets:
+			raise ValueError("no rows to facet in %s" % (config["input"]))
+		
+		scale = None
+		if (self.FACET_SCALES == "shared"):
+			scale = self.sharedScale(facets)
+			self.tick("sharedScale")
+		
+		base = dict([ (k, v) for k, v in config.items() if k != "facet_by" ])
+		
+		if (self.FACET_LAYOUT == "grid"):
+			jobs = [ (base, rows, scale, True) for rows in facets.values() ]
+		else:
+			jobs = [ (dict(base, output=base.get("output", "slopegraph") + "-" + slug), rows, scale, False) for slug, rows in zip(facetSlugs(list(facets.keys())), facets.values()) ]
+		
+		results = renderFacetJobs(jobs, self.FACET_WORKERS, self.metrics)
+		self.tick("facets")
+		
+		if (self.FACET_LAYOUT == "grid"):
+			
+			self.composeGrid(list(facets.keys()), results)
+			self.tick("layout")
+			
+			OUTPUT_FILES = [ config.get("output", "slopegraph") + "." + fmt for fmt in formatList(config) ]
+			outs = out
+			if not isinstance(outs, list):
+				if (out is not None) and (len(OUTPUT_FILES) > 1):
+					raise ValueError("several formats need one output file object each")
+				outs = [ out ] * len(OUTPUT_FILES)
+			
+			self.writeLayout(OUTPUT_FILES, config, outs)
+			
+			OUTPUT_FILES = outputNames(config)
+			if not isinstance(config["format"], list):
+				OUTPUT_FILES = OUTPUT_FILES[0]
+		
+		else:
+			
+			OUTPUT_FILES = []
+			for names in results:
+				if isinstance(names, list):
+					OUTPUT_FILES.extend(names)
+				else:
+					OUTPUT_FILES.append(names)
+		
+		self.metrics.save()
+		self.tick("saveMetrics")
+		
+		if self.stats is not None:
+			self.stats.update({
+				"output" : (out is None) and (outputNames(config) or OUTPUT_FILES) or None,
+				"format" : config["format"],
+				"facets" : len(facets),
+				"seconds" : sum(self.stats["phases"].values()),
+			})
+			if (self.FACET_LAYOUT == "grid"):
+				self.stats.update({ "width" : self.width, "height" : self.height })
+			self.statsHook(self.stats)
+		
+		return(OUTPUT_FILES)
+	
+	def composeGrid(self, names, layouts):
+		
+		# tile the facets' layouts into one page (one same-sized cell each,
+		# titled with the facet) & make that the layout to write. titles use
+		# the header font, or the label font when there are no headers
+		
+		if (self.HEADER_FONT_FAMILY == None):
+			self.HEADER_FONT_FAMILY = self.LABEL_FONT_FAMILY
+			self.HEADER_FONT_SIZE = self.LABEL_FONT_SIZE
+			self.HEADER_COLOR = self.LABEL_COLOR
+		
+		columns = self.FACET_COLUMNS
+		if columns == None:
+			columns = int(math.ceil(math.sqrt(len(layouts))))
+		rows = int(math.ceil(len(layouts) / float(columns)))
+		
+		cellWidth = max([ l["width"] for l in layouts ])
+		titleSpace = 2 * self.HEADER_FONT_SIZE
+		cellHeight = max([ l["height"] for l in layouts ]) + titleSpace
+		
+		headers, texts, lines = [], [], []
+		
+		for i, (name, l) in enumerate(zip(names, layouts)):
+			
+			dx = (i % columns) * cellWidth
+			dy = (i // columns) * cellHeight
+			
+			title = str(name)
+			headers.append({ "text" : title, "x" : dx + self.X_MARGIN, "y" : dy + 1.5 * self.HEADER_FONT_SIZE,
+							"width" : self.textExtents(title, self.HEADER_FONT_FAMILY, self.HEADER_FONT_SIZE, FONT_WEIGHT_BOLD)[2],
+							"anchor" : "start", "style" : "header" })
+			
+			dy += titleSpace
+			
+			for t in l["headers"]:
+				headers.append(dict(t, x=t["x"] + dx, y=t["y"] + dy))
+			for t in l["texts"]:
+				texts.append(dict(t, x=t["x"] + dx, y=t["y"] + dy))
+			for line in l["lines"]:
+				points = list(line["points"])
+				points[0::2] = [ x + dx for x in points[0::2] ]
+				points[1::2] = [ y + dy for y in points[1::2] ]
+				lines.append(dict(line, points=points))
+		
+		self.width = columns * cellWidth
+		self.height = rows * cellHeight
+		self.layout = { "width" : self.width, "height" : self.height, "headers" : headers, "texts" : texts, "lines" : lines }
+	
+	def render(self, config, rows=None, out=None, scale=None):
+		
+		# render one chart; "rows" (an iterable of (label, value, ...)) takes
+		# the place of the "input" CSV when given & "out" (a binary file
+		# object, or a list of them when "format" is a list) the place of
+		# the "output" file. returns the output file name (or names). with
+		# "facet_by" set, renders one chart per facet (see renderFacets())
+		
+		# (the hook may have been dropped since the last render)
+		
+		self.stats = None
+		if self.statsHook is not None:
+			self.stats = { "phases" : {} }
+			self.lapStart = clock()
+		
+		# "output" : "-" writes the chart to stdout
+		
+		if (out is None) and (config.get("output") == "-"):
+			out = stdoutBytes()
+		
+		if config.get("facet_by") != None:
+			return(self.renderFacets(config, out))
+		
+		OUTPUT_FILES = [ config.get("output", "slopegraph") + "." + fmt for fmt in formatList(config) ]
+		
+		outs = out
+		if not isinstance(outs, list):
+			outs = (out is not None) and [ out ] or []
+		outStarts = [ tell(f) for f in outs ]
+		
+		# process the values & make the slopegraph
+		
+		self.prepare(config, rows, scale)
+		lookups, measured = self.metricsMark
+		
+		self.makeSlopegraph(OUTPUT_FILES, config, out)
+		
+		self.metrics.save()
+		self.tick("saveMetrics")
+		
+		if self.stats is not None:
+			
+			if out is None:
+				outputBytes = sum([ os.path.getsize(name) for name in outputNames(config) ])
+			else:
+				outEnds = [ tell(f) for f in outs ]
+				if None in (outStarts + outEnds):
+					outputBytes = None
+				else:
+					outputBytes = sum([ e - s for s, e in zip(outStarts, outEnds) ])
+			
+			self.stats.update({
+				"output" : (out is None) and outputNames(config) or None,
+				"format" : config["format"],
+				"width" : self.width,
+				"height" : self.height,
+				"seconds" : sum(self.stats["phases"].values()),
+				"counters" : {
+					"rows" : len(self.labels),
+					"start_keys" : len(self.startKeys),
+					"end_keys" : len(self.endKeys),
+					"text_extents" : self.metrics.hits + self.metrics.misses - lookups,
+					"text_measured" : self.metrics.misses - measured,
+					"texts" : len(self.layout["headers"]) + len(self.layout["texts"]),
+					"lines" : len(self.layout["lines"]),
+					"strokes" : self.strokes,
+					"output_bytes" : outputBytes,
+				},
+			})
+			
+			self.statsHook(self.stats)
+		
+		names = outputNames(config)
+		if isinstance(config["format"], list):
+			return(names)
+		
+		return(names[0])
+	
+	def renderBytes(self, config, data=None, rows=None):
+		
+		# render in memory: "data" (CSV text or bytes) or "rows" take the
+		# place of the "input" file; returns the chart as bytes (a list of
+		# them, one per format, when "format" is a list)
+		
+		if data is not None:
+			config = dict(config, input=csvSource(data))
+		
+		outs = [ io.BytesIO() for fmt in formatList(config) ]
+		
+		if isinstance(config["format"], list):
+			self.render(config, rows, outs)
+			return([ out.getvalue() for out in outs ])
+		
+		self.render(config, rows, outs[0])
+		return(outs[0].getvalue())
+	
+	def renderJobs(self, jobs):
+		
+		# render a stream of (config, rows) jobs with this one (warm) renderer;
+		# rows may be None to read the config's "input". yields output names
+		
+		for config, rows in jobs:
+			yield self.render(config, rows)
+	
+	def __init__(self, config=None, metrics=None, statsHook=None):
+		
+		# PySlopegraph(config) still renders straight away; PySlopegraph()
+		# gives a reusable renderer for render()/renderJobs(). "metrics" is
+		# an optional (shared) TextMetrics cache. "statsHook" is called with
+		# a dict of per-phase timings, counters & the canvas size after every
+		# render (nothing is timed/counted without one)
+		
+		self.ownMetrics = metrics is None
+		if metrics is None:
+			metrics = TextMetrics()
+		
+		self.metrics = metrics
+		self.statsHook = statsHook
+		self.stats = None
+		self.PERIODS = 2
+		self.fontFaces = {}
+		self.fontOptions = None # set up (with cairo) by useCairo()
+		self.measureCr = None
+		self.measureFont = None
+		self.scale = None
+		self.csvNames = None
+		self.TOP_N = None
+		self.reset()
+		
+		if config is not None:
+			self.render(config)
+
+
+class CSVFollower:
+	
+	# follows a growing CSV: read() hands back only the complete lines
+	# appended since the last call (a partial last line waits for its
+	# newline); a file that shrank or was replaced starts over from the top
+	
+	def __init__(self, filename):
+		
+		self.filename = filename
+		self.offset = 0
+		self.pending = b""
+		self.inode = None
+		self.stamp = None
+	
+	def stat(self):
+		
+		try:
+			st = os.stat(self.filename)
+		except OSError:
+			return(None)
+		
+		return((st.st_ino, st.st_size, st.st_mtime))
+	
+	def changed(self):
+		
+		return(self.stat() != self.stamp)
+	
+	def read(self):
+		
+		# returns (text, restarted?)
+		
+		stamp = self.stat()
+		self.stamp = stamp
+		
+		if stamp is None:
+			return("", False)
+		
+		restarted = False
+		if (stamp[0] != self.inode) or (stamp[1] < self.offset):
+			restarted = (self.inode is not None)
+			self.inode = stamp[0]
+			self.offset = 0
+			self.pending = b""
+		
+		with open(self.filename, "rb") as f:
+			f.seek(self.offset)
+			data = self.pending + f.read()
+		
+		self.offset += len(data) - len(self.pending)
+		
+		end = data.rfind(b"\n") + 1
+		self.pending = data[end:]
+		data = data[:end]
+		
+		if sys.version_info[0] >= 3:
+			data = data.decode("utf-8")
+		
+		return(data, restarted)
+
+def settle(follower, debounce):
+	
+	# let a burst of writes finish: wait until the file has been quiet for
+	# "debounce" seconds (but no more than 10x that for a non-stop writer)
+	
+	stamp = follower.stat()
+	waited = 0.0
+	
+	while waited < 10 * debounce:
+		time.sleep(debounce)
+		waited += debounce
+		now = follower.stat()
+		if now == stamp:
+			return
+		stamp = now
+
+def watch(configFile, metrics=None, statsHook=None, interval=1.0, debounce=0.5):
+	
+	# render the config, then keep following its input CSV: only appended
+	# bytes are parsed (onto the rows already read) & the chart is only
+	# re-written when the layout actually changed. an edited config, or an
+	# input that shrank/was replaced (or uses top_n, where new rows can
+	# push old ones out), is read from scratch, as is one that had nothing
+	# in it (not even its header) yet. runs until interrupted
+	
+	sg = PySlopegraph(metrics=metrics, statsHook=statsHook)
+	
+	configStamp = None
+	follower = None
+	lastLayout = None
+	started = False
+	
+	while True:
+		
+		stamp = os.path.getmtime(configFile)
+		fresh = (stamp != configStamp)
+		
+		if fresh:
+			config = loadConfig(configFile)
+			configStamp = stamp
+			if config.get("facet_by") != None:
+				raise ValueError("--watch doesn't support facet_by")
+			if (config["input"] == "-"):
+				raise ValueError("--watch needs an input file, not stdin")
+			if (config.get("output") == "-"):
+				raise ValueError("--watch needs an output file, not stdout")
+			follower = CSVFollower(config["input"])
+			lastLayout = None
+		elif not follower.changed():
+			time.sleep(interval)
+			continue
+		else:
+			settle(follower, debounce)
+		
+		sg.stats = None
+		if sg.statsHook is not None:
+			sg.stats = { "phases" : {} }
+			sg.lapStart = clock()
+		
+		text, restarted = follower.read()
+		
+		if fresh or restarted or (sg.TOP_N != None) or not started:
+			if not fresh:
+				follower = CSVFollower(config["input"])
+				text, restarted = follower.read()
+			sg.configure(config)
+			sg.reset()
+			sg.scale = None
+			continued = False
+			started = bool(text) # the header (if any) & first rows are in
+		else:
+			continued = True
+		
+		before = len(sg.labels)
+		sg.readRows(sg.selectRows(io.StringIO(text, newline="") if sys.version_info[0] >= 3 else io.BytesIO(text), continued))
+		sg.tick("read")
+		
+		if not sg.labels or (continued and len(sg.labels) == before):
+			continue
+		
+		sg.analyse()
+		sg.computeLayout(config)
+		sg.tick("layout")
+		
+		if (sg.layout == lastLayout):
+			continue
+		lastLayout = sg.layout
+		
+		OUTPUT_FILES = [ config.get("output", "slopegraph") + "." + fmt for fmt in formatList(config) ]
+		sg.writeLayout(OUTPUT_FILES, config, [ None ] * len(OUTPUT_FILES))
+		sg.metrics.save()
+		
+		print("rendered %s (%d rows, %d new)" % (configFile, len(sg.labels), len(sg.labels) - before))
+		sys.stdout.flush()
+		
+		if sg.stats is not None:
+			sg.stats.update({ "output" : outputNames(config), "format" : config["format"], "width" : sg.width, "height" : sg.height,
+							"rows" : len(sg.labels), "new_rows" : len(sg.labels) - before, "seconds" : sum(sg.stats["phases"].values()) })
+			sg.statsHook(sg.stats)
+
+def loadConfig(configFile):
+	
+	json_data = open(configFile)
+	config = json.load(json_data)
+	json_data.close()
+	
+	return(config)
+
+# one renderer per (worker) process, kept warm between configs
+
+renderer = None
+metricsCache = None
+collectStats = False
+
+def renderDigest(config, chunks, exclude=()):
+	
+	# hash of everything that decides what a chart looks like: the renderer
+	# version, the (canonical) config & the input data chunks
+	
+	digest = hashlib.sha1(__version__.encode("utf-8"))
+	
+	normalized = dict([ (k, v) for k, v in config.items() if k not in exclude ])
+	digest.update(b"\0")
+	digest.update(json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode("utf-8"))
+	digest.update(b"\0")
+	
+	for chunk in chunks:
+		if not isinstance(chunk, bytes):
+			chunk = chunk.encode("utf-8")
+		digest.update(chunk)
+	
+	return(digest.hexdigest())
+
+def fileChunks(filename, size=65536):
+	
+	f = open(filename, "rb")
+	try:
+		chunk = f.read(size)
+		while chunk:
+			yield chunk
+			chunk = f.read(size)
+	finally:
+		f.close()
+
+def formatList(config):
+	
+	# "format" is one format name or a list of them
+	
+	formats = config["format"]
+	if not isinstance(formats, list):
+		formats = [ formats ]
+	
+	return(formats)
+
+def outputNames(config):
+	
+	# the files render() ends up writing for a config (per facet files
+	# aren't known before the CSV is read, so those give none)
+	
+	if (config.get("facet_by") != None) and (config.get("facet_layout", "files") == "files"):
+		return([])
+	
+	names = []
+	for fmt in formatList(config):
+		name = config.get("output", "slopegraph") + "." + fmt
+		if (fmt == "js"):
+			name += ".html"
+		elif (fmt == "layout"):
+			name += ".json"
+		names.append(name)
+	
+	return(names)
+
+def tell(f):
+	
+	# current position of a file object, or None if it can't say (pipes)
+	
+	try:
+		return(f.tell())
+	except (AttributeError, IOError, OSError, ValueError):
+		return(None)
+
+def facetSlug(facet):
+	
+	# facet value -> something safe to put in a file name
+	
+	slug = re.sub(r"[^A-Za-z0-9._-]+", "-", str(facet)).strip("-")
+	
+	return(slug or "facet")
+
+def facetSlugs(facets):
+	
+	# one slug per facet, in order; facets whose slugs collide ("W/x" &
+	# "W-x") get "-2", "-3", ... (never another facet's own slug) so one
+	# can't overwrite the other's files
+	
+	bases = [ facetSlug(facet) for facet in facets ]
+	used = set(bases)
+	taken = set()
+	slugs = []
+	
+	for base in bases:
+		slug = base
+		n = 1
+		while (slug in taken) or ((slug != base) and (slug in used)):
+			n += 1
+			slug = "%s-%d" % (base, n)
+		taken.add(slug)
+		slugs.append(slug)
+	
+	return(slugs)
+
+def renderFacet(job, sg=None):
+	
+	# one facet: (config, rows, shared scale, layout only?) -> its layout
+	# (for a grid) or its output file name(s). runs on the (warm) worker
+	# renderer unless one is given
+	
+	global renderer
+	
+	config, rows, scale, layoutOnly = job
+	
+	if sg is None:
+		if renderer is None:
+			renderer = PySlopegraph(metrics=sharedMetrics(metricsCache))
+		sg = renderer
+	
+	if layoutOnly:
+		layout = sg.layoutChart(config, rows, scale)
+		sg.metrics.save()
+		return(layout)
+	
+	return(sg.render(config, rows, scale=scale))
+
+def renderFacetJobs(jobs, workers=None, metrics=None):
+	
+	# facets are independent, so spread them across a pool of processes
+	# (in order); stays serial for a single facet, "workers" of 1, or when
+	# already inside a (daemonic) --batch worker that can't have children
+	
+	if (workers == 1) or (len(jobs) <= 1) or multiprocessing.current_process().daemon:
+		sg = PySlopegraph(metrics=metrics)
+		return([ renderFacet(job, sg) for job in jobs ])
+	
+	metricsFile = None
+	if metrics is not None:
+		metrics.save()
+		metricsFile = metrics.filename
+	
+	pool = multiprocessing.Pool(workers, initWorker, (metricsFile,))
+	try:
+		return(pool.map(renderFacet, jobs))
+	finally:
+		pool.close()
+		pool.join()
+
+def renderConfig(job):
+	
+	# render one (config file, manifest entry) job; errors are handed back
+	# to the caller instead of being raised so that a single bad config/CSV
+	# can't sink a whole batch. a manifest entry is { "digest" : ...,
+	# "outputs" : [ files written ] }; when the config, its CSV & the
+	# renderer version hash to the digest recorded last time (and all those
+	# files are still there) the render is skipped. returns (file, error,
+	# entry, skipped, stats) where stats is only filled in when collectStats
+	# is set
+	
+	global renderer
+	
+	configFile, previous = job
+	stats = []
+	
+	try:
+		config = loadConfig(configFile)
+		if "-" in (config["input"], config.get("output")):
+			raise ValueError("stdin/stdout ('-') can't be used in batches or with a manifest")
+		digest = renderDigest(config, fileChunks(config["input"]), ("input",))
+		
+		outputs = []
+		if isinstance(previous, dict) and (previous.get("digest") == digest):
+			outputs = previous.get("outputs") or []
+		
+		if outputs and all([ os.path.exists(name) for name in outputs ]):
+			return (configFile, None, previous, True, None)
+		
+		if renderer is None:
+			renderer = PySlopegraph(metrics=sharedMetrics(metricsCache))
+		renderer.statsHook = collectStats and stats.append or None
+		outputs = renderer.render(config)
+	except Exception as e:
+		return (configFile, "%s: %s" % (e.__class__.__name__, e), None, False, None)
+	
+	if not isinstance(outputs, list):
+		outputs = [ outputs ]
+	
+	return (configFile, None, { "digest" : digest, "outputs" : outputs }, False, stats and stats[0] or None)
+
+def loadManifest(filename):
+	
+	# { config file : { "digest" : ..., "outputs" : [...] } } from the last
+	# run (empty if there's none)
+	
+	if (filename is None) or not os.path.exists(filename):
+		return({})
+	
+	try:
+		f = open(filename)
+		try:
+			return(json.load(f))
+		finally:
+			f.close()
+	except ValueError:
+		return({})
+
+def saveManifest(filename, manifest):
+	
+	# write to a temp file & rename it into place so a run that dies
+	# part way through can't leave a truncated manifest behind
+	
+	fd, tmpName = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+	f = os.fdopen(fd, "w")
+	try:
+		json.dump(manifest, f, sort_keys=True, indent=1)
+	finally:
+		f.close()
+	
+	os.rename(tmpName, filename)
+
+def expandConfigs(patterns):
+	
+	# expand any globs (quoted on the command line so the shell doesn't);
+	# names that match nothing are kept so they get reported as failures
+	
+	configs = []
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern))
+		if matches:
+			configs.extend(matches)
+		else:
+			configs.append(pattern)
+	
+	return(configs)
+
+def initWorker(metricsFile, stats=False):
+	
+	global metricsCache, collectStats
+	metricsCache = metricsFile
+	collectStats = stats
+
+def statsWriter(stream):
+	
+	# a stats hook writing one JSON object per render (JSON lines) to "stream"
+	
+	def write(stats):
+		stream.write(json.dumps(stats, sort_keys=True) + "\n")
+		stream.flush()
+	
+	return(write)
+
+def renderBatch(configs, workers=None, metricsFile=None, manifestFile=None, statsHook=None):
+	
+	# render all the configs across a pool of worker processes so the
+	# interpreter/cairo startup cost is paid once per worker, not per chart.
+	# with a manifest file, configs whose config/CSV haven't changed since
+	# the last run are skipped. "statsHook" gets each chart's stats (tagged
+	# with its config file)
+	
+	failures = []
+	
+	manifest = loadManifest(manifestFile)
+	jobs = [ (configFile, manifest.get(configFile)) for configFile in configs ]
+	
+	initWorker(metricsFile, statsHook is not None)
+	
+	if (workers == 1) or (len(jobs) <= 1):
+		pool = None
+		results = map(renderConfig, jobs)
+	else:
+		pool = multiprocessing.Pool(workers, initWorker, (metricsFile, statsHook is not None))
+		results = pool.imap(renderConfig, jobs)
+	
+	try:
+		for configFile, error, entry, skipped, stats in results:
+			if stats is not None:
+				stats["config"] = configFile
+				statsHook(stats)
+			if error is None:
+				manifest[configFile] = entry
+				print("%s %s" % (skipped and "unchanged" or "rendered", configFile))
+			else:
+				manifest.pop(configFile, None)
+				failures.append((configFile, error))
+				sys.stderr.write("FAILED %s: %s\n" % (configFile, error))
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+		if manifestFile is not None:
+			saveManifest(manifestFile, manifest)
+	
+	return(failures)
+
+class RenderService:
+	
+	# renders (config, CSV text) requests with a fixed pool of warm renderers
+	# (which also bounds how many renders run at once) & keeps an LRU cache
+	# of finished charts keyed by a hash of the normalized config + data
+	
+	contentTypes = { "pdf" : "application/pdf", "ps" : "application/postscript", "svg" : "image/svg+xml",
+					"png" : "image/png", "js" : "text/html", "pde" : "text/plain", "layout" : "application/json" }
+	
+	# config keys naming files on the server; clients can't set them
+	
+	fileKeys = ("input", "output", "metrics_cache", "font_files")
+	
+	def __init__(self, workers=4, cacheSize=256, metricsFile=None):
+		
+		self.renderers = queue.Queue()
+		for i in range(workers):
+			self.renderers.put(PySlopegraph(metrics=TextMetrics(filename=metricsFile)))
+		
+		self.cacheSize = cacheSize
+		self.cache = collections.OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+	
+	def render(self, config, data):
+		
+		# returns (content type, rendered bytes, was it cached?)
+		
+		if isinstance(config.get("format"), list):
+			raise ValueError("one format per request")
+		
+		refused = [ k for k in self.fileKeys if k in config ]
+		if refused:
+			raise ValueError("config keys not allowed in a render request: %s" % (", ".join(refused)))
+		
+		# facets render serially: forking a facet pool from a server thread
+		# could deadlock on locks other threads hold (& would cost a pool
+		# start per request)
+		
+		if config.get("facet_by") != None:
+			config = dict(config, facet_workers=1)
+		
+		contentType = self.contentTypes.get(config.get("format"), "application/pdf")
+		key = renderDigest(config, [ data ])
+		
+		with self.lock:
+			if key in self.cache:
+				self.hits += 1
+				body = self.cache.pop(key)
+				self.cache[key] = body
+				return(contentType, body, True)
+			self.misses += 1
+		
+		renderer = self.renderers.get()
+		try:
+			body = renderer.renderBytes(config, data)
+		finally:
+			self.renderers.put(renderer)
+		
+		with self.lock:
+			self.cache[key] = body
+			while len(self.cache) > self.cacheSize:
+				self.cache.popitem(last=False)
+		
+		return(contentType, body, False)
+	
+	def stats(self):
+		
+		with self.lock:
+			return({ "hits" : self.hits, "misses" : self.misses, "entries" : len(self.cache) })
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+	
+	daemon_threads = True
+
+
+def renderServer(address, service):
+	
+	# the HTTP server behind serve(), bound but not yet serving (port 0
+	# picks a free port; see server_address):
+	# POST /render with {"config" : {...}, "csv" : "..."} -> the rendered chart
+	# GET /stats -> output cache hit/miss counts as JSON
+	
+	class RenderHandler(BaseHTTPRequestHandler):
+		
+		def reply(self, code, contentType, body, headers={}):
+			
+			self.send_response(code)
+			self.send_header("Content-Type", contentType)
+			self.send_header("Content-Length", str(len(body)))
+			for k, v in headers.items():
+				self.send_header(k, v)
+			self.end_headers()
+			self.wfile.write(body)
+		
+		def do_GET(self):
+			
+			if (self.path == "/stats"):
+				self.reply(200, "application/json", json.dumps(service.stats()).encode("utf-8"))
+			else:
+				self.reply(404, "text/plain", b"not found\n")
+		
+		def do_POST(self):
+			
+			if (self.path != "/render"):
+				self.reply(404, "text/plain", b"not found\n")
+				return
+			
+			try:
+				length = int(self.headers.get("Content-Length", 0))
+				request = json.loads(self.rfile.read(length).decode("utf-8"))
+				contentType, body, cached = service.render(request["config"], request["csv"])
+			except Exception as e:
+				self.reply(400, "text/plain", ("%s: %s\n" % (e.__class__.__name__, e)).encode("utf-8"))
+				return
+			
+			self.reply(200, contentType, body, { "X-Slopegraph-Cache" : cached and "hit" or "miss" })
+	
+	return(ThreadedHTTPServer(address, RenderHandler))
+
+def serve(address, service):
+	
+	server = renderServer(address, service)
+	
+	try:
+		server.serve_forever()
+	finally:
+		server.server_close()
+
+def main():
+	
+	parser = argparse.ArgumentParser(description="Creates a slopegraph from a CSV source",
+									fromfile_prefix_chars="@")
+	group = parser.add_mutually_exclusive_group(required=True)
+	group.add_argument("--config",
+					help="config file name to use for slopegraph creation",)
+	group.add_argument("--batch", nargs="+", metavar="CONFIG",
+					help="config files (or quoted globs) to render in one go; use @FILE to read the list from a file",)
+	group.add_argument("--serve", metavar="[HOST:]PORT",
+					help="run a local HTTP render service (POST /render, GET /stats)",)
+	parser.add_argument("--workers", type=int, default=None,
+					help="number of worker processes for --batch / concurrent renders for --serve (default: # of CPUs)",)
+	parser.add_argument("--cache-size", type=int, default=256,
+					help="number of rendered charts --serve keeps in its output cache",)
+	parser.add_argument("--metrics-cache", default=None, metavar="FILE",
+					help="JSON file used to persist/share the text metrics cache",)
+	parser.add_argument("--stats", nargs="?", const="-", default=None, metavar="FILE",
+					help="write per-phase timings & counters for every chart as JSON lines to FILE (default: stderr)",)
+	parser.add_argument("--watch", action="store_true",
+					help="with --config: keep following the input CSV & re-render as rows are appended",)
+	parser.add_argument("--interval", type=float, default=1.0,
+					help="seconds between checks of the input for --watch (default: %(default)s)",)
+	parser.add_argument("--debounce", type=float, default=0.5,
+					help="seconds the input must be quiet before --watch re-renders (default: %(default)s)",)
+	parser.add_argument("--manifest", default=None, metavar="FILE",
+					help="JSON file of config/CSV hashes; configs unchanged since the last run are skipped",)
+	args = parser.parse_args()
+	
+	statsHook = None
+	if args.stats == "-":
+		statsHook = statsWriter(sys.stderr)
+	elif args.stats is not None:
+		statsHook = statsWriter(open(args.stats, "w"))
+	
+	if args.serve:
+		
+		host, sep, port = args.serve.rpartition(":")
+		if not host:
+			host = "127.0.0.1"
+		
+		workers = args.workers
+		if workers is None:
+			workers = multiprocessing.cpu_count()
+		
+		serve((host, int(port)), RenderService(workers, args.cache_size, args.metrics_cache))
+	
+	elif args.batch:
+		
+		configs = expandConfigs(args.batch)
+		failures = renderBatch(configs, args.workers, args.metrics_cache, args.manifest, statsHook)
+		
+		if failures:
+			sys.stderr.write("%d of %d configs failed\n" % (len(failures), len(configs)))
+			return(1)
+	
+	elif args.config and args.watch:
+		
+		try:
+			watch(args.config, sharedMetrics(args.metrics_cache), statsHook, args.interval, args.debounce)
+		except KeyboardInterrupt:
+			pass
+	
+	elif args.config and args.manifest:
+		
+		if renderBatch([ args.config ], 1, args.metrics_cache, args.manifest, statsHook):
+			return(1)
+	
+	elif args.config:
 		
-		PySlopegraph(config)
+		PySlopegraph(loadConfig(args.config), sharedMetrics(args.metrics_cache), statsHook)
 	
 	return(0)
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+#
+# test_slopegraph.py - checks for slopegraph.py
+#
+# incremental updates (addRow/updateRow/removeRow + refreshKeys) have to
+# give the same chart as reading the same rows afresh. run with
+# "python -m unittest test_slopegraph" (or pytest)
+#
+
+import json
+import random
+import threading
+import unittest
+
+try:
+	from urllib.request import Request, urlopen
+	from urllib.error import HTTPError
+except ImportError:
+	from urllib2 import Request, urlopen, HTTPError
+
+import slopegraph
+
+BASE_CONFIG = {
+	"label_font_family" : "Helvetica",
+	"label_font_size" : "9",
+	"header_font_family" : "Helvetica",
+	"header_font_size" : "10",
+	"x_margin" : "20",
+	"y_margin" : "30",
+	"line_width" : "1.0",
+	"slope_length" : "200",
+	"header_color" : "000000",
+	"background_color" : "FFFFFF",
+	"label_color" : "111111",
+	"value_color" : "999999",
+	"slope_color" : "C98360",
+	"value_format_string" : "%.2f",
+	"format" : "layout",
+	"font_metrics" : "python",
+	"vectorize" : "no",
+}
+
+def currentRows(sg):
+
+	# the renderer's rows, in row order, as readRows() takes them
+
+	return([ [ lab ] + [ column[r] for column in sg.columns ] for r, lab in enumerate(sg.labels) ])
+
+class IncrementalTest(unittest.TestCase):
+
+	def compare(self, sg, config):
+
+		sg.refreshKeys()
+		sg.calculateExtents()
+		sg.computeLayout(config)
+
+		fresh = slopegraph.PySlopegraph()
+		fresh.layoutChart(config, currentRows(sg))
+
+		self.assertEqual(sg.starts, fresh.starts)
+		self.assertEqual(sg.ends, fresh.ends)
+		self.assertEqual(sg.columnKeys, fresh.columnKeys)
+		self.assertEqual((sg.lowest, sg.highest, sg.delta), (fresh.lowest, fresh.highest, fresh.delta))
+		self.assertEqual(sg.layout, fresh.layout)
+
+	def randomValues(self, rnd, periods, distinct):
+
+		return([ rnd.randint(1, distinct) * 1.5 for p in range(periods) ])
+
+	def runTrials(self, config, periods=2, distinct=6, trials=20, ops=60):
+
+		rnd = random.Random(periods * 1000 + distinct)
+		config = dict(config, labels=[ "P%d" % p for p in range(periods) ])
+
+		for trial in range(trials):
+
+			rows = [ [ "r%d" % i ] + self.randomValues(rnd, periods, distinct) for i in range(rnd.randint(1, 12)) ]
+			nextLabel = len(rows)
+
+			sg = slopegraph.PySlopegraph()
+			sg.prepare(config, rows)
+
+			for op in range(ops):
+
+				kind = rnd.random()
+				if (kind < 0.4) or (len(sg.labels) == 1):
+					sg.addRow("r%d" % nextLabel, self.randomValues(rnd, periods, distinct))
+					nextLabel += 1
+				elif (kind < 0.7):
+					sg.updateRow(rnd.choice(sg.labels), self.randomValues(rnd, periods, distinct))
+				else:
+					sg.removeRow(rnd.choice(sg.labels))
+
+				if (op % 5 == 4):
+					self.compare(sg, config)
+
+			self.compare(sg, config)
+
+	def test_linear(self):
+
+		self.runTrials(BASE_CONFIG)
+
+	def test_heavy_ties(self):
+
+		self.runTrials(BASE_CONFIG, distinct=2)
+
+	def test_log_ascending(self):
+
+		self.runTrials(dict(BASE_CONFIG, log_scale="true", sort="ascending"))
+
+	def test_three_periods(self):
+
+		self.runTrials(BASE_CONFIG, periods=3)
+
+	def test_group_limit_and_rounding(self):
+
+		self.runTrials(dict(BASE_CONFIG, label_group_limit="2", round_precision="0"), distinct=3)
+
+	def test_duplicate_label(self):
+
+		sg = slopegraph.PySlopegraph()
+		sg.prepare(BASE_CONFIG, [ [ "a", 1, 2 ], [ "b", 3, 4 ] ])
+
+		self.assertRaises(ValueError, sg.addRow, "a", [ 5, 6 ])
+
+@unittest.skipIf(slopegraph.loadNumpy() is None, "numpy isn't installed")
+class VectorizeTest(unittest.TestCase):
+
+	# vectorize "yes" (numpy) has to give exactly the chart "no" does
+
+	def compareModes(self, config, rows):
+
+		layouts = []
+		for mode in ("no", "yes"):
+			sg = slopegraph.PySlopegraph()
+			layouts.append(sg.layoutChart(dict(config, vectorize=mode), rows))
+
+		self.assertEqual(layouts[0], layouts[1])
+
+	def test_parity(self):
+
+		rnd = random.Random(22)
+		values = [ "-0", "0", "0.0", "1", "2.5", "-1", "1e3", " 7 ", "3.14159" ]
+
+		for trial in range(100):
+			periods = rnd.randint(2, 4)
+			config = dict(BASE_CONFIG, labels=[ "P%d" % p for p in range(periods) ], value_format_string="%.1f")
+			if (trial % 3 == 1):
+				config["round_precision"] = "1"
+			if (trial % 4 == 2):
+				config["label_group_limit"] = "2"
+			rows = [ [ "r%d" % i ] + [ rnd.choice(values) for p in range(periods) ] for i in range(rnd.randint(1, 40)) ]
+			self.compareModes(config, rows)
+
+	def test_parity_log_scale(self):
+
+		rnd = random.Random(23)
+		rows = [ [ "r%d" % i, rnd.uniform(1, 1e6), rnd.uniform(1, 1e6), rnd.choice([ 1, 10, 100 ]) ] for i in range(500) ]
+
+		self.compareModes(dict(BASE_CONFIG, labels=[ "a", "b", "c" ], log_scale="true", value_format_string="%d"), rows)
+
+	def test_parity_across_chunks(self):
+
+		rnd = random.Random(24)
+		rows = [ [ "r%d" % i, rnd.randint(1, 50), rnd.randint(1, 50) ] for i in range(slopegraph.VECTOR_CHUNK + 100) ]
+
+		self.compareModes(dict(BASE_CONFIG, labels=[ "a", "b" ]), rows)
+
+class StatsTest(unittest.TestCase):
+
+	def test_hook_dropped_between_renders(self):
+
+		seen = []
+		sg = slopegraph.PySlopegraph(statsHook=seen.append)
+		config = dict(BASE_CONFIG, labels=[ "x", "y" ])
+
+		sg.renderBytes(config, "a,1,2\nb,3,1\n")
+		sg.statsHook = None
+		sg.renderBytes(config, "a,1,2\nb,3,1\n")
+
+		self.assertEqual(len(seen), 1)
+		self.assertEqual(sg.stats, None)
+
+class RenderServiceTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.server = slopegraph.renderServer(("127.0.0.1", 0), slopegraph.RenderService(workers=2))
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.daemon = True
+		self.thread.start()
+		self.url = "http://127.0.0.1:%d" % (self.server.server_address[1])
+
+	def tearDown(self):
+
+		self.server.shutdown()
+		self.server.server_close()
+		self.thread.join()
+
+	def post(self, config, csv):
+
+		body = json.dumps({ "config" : config, "csv" : csv }).encode("utf-8")
+		return(urlopen(Request(self.url + "/render", body, { "Content-Type" : "application/json" })))
+
+	def test_cache_miss_then_hit(self):
+
+		config = dict(BASE_CONFIG, labels=[ "x", "y" ])
+		csv = "a,1,2\nb,3,1\n"
+
+		first = self.post(config, csv)
+		self.assertEqual(first.headers["X-Slopegraph-Cache"], "miss")
+		chart = json.loads(first.read().decode("utf-8"))
+		self.assertEqual(len(chart["lines"]), 2)
+
+		second = self.post(config, csv)
+		self.assertEqual(second.headers["X-Slopegraph-Cache"], "hit")
+
+		stats = json.loads(urlopen(self.url + "/stats").read().decode("utf-8"))
+		self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+	def test_file_keys_refused(self):
+
+		config = dict(BASE_CONFIG, labels=[ "x", "y" ], input="/etc/passwd")
+
+		try:
+			self.post(config, "a,1,2\n")
+			self.fail("input was accepted")
+		except HTTPError as e:
+			self.assertEqual(e.code, 400)
+			self.assertTrue(b"input" in e.read())
+
+if __name__ == "__main__":
+	unittest.main()
+
+class ExtentsTest(unittest.TestCase):
+
+	def test_one_value_per_period_still_slopes(self):
+
+		sg = slopegraph.PySlopegraph()
+		layout = sg.layoutChart(dict(BASE_CONFIG, labels=[ "x", "y" ]), [ [ "a", 1, 2 ], [ "b", 1, 2 ] ])
+
+		x1, y1, x2, y2 = layout["lines"][0]["points"]
+		self.assertTrue(y2 < y1)
+
+	def test_log_values_without_a_gap(self):
+
+		# two values whose logs are the same double: delta is 0
+
+		rows = [ [ "a", 1000.0, 5 ], [ "b", 1000.0000000000001, 7 ] ]
+
+		for placement in ("packed", "delta"):
+			sg = slopegraph.PySlopegraph()
+			sg.layoutChart(dict(BASE_CONFIG, labels=[ "x", "y" ], log_scale="true", label_placement=placement), rows)
+			self.assertTrue(sg.plotHeight > 0)
+
+	def test_level_of_detail_settings_checked(self):
+
+		for bad in ({ "detail_rows" : "0" }, { "detail_rows" : "-3" }, { "density_bins" : "0" }):
+			sg = slopegraph.PySlopegraph()
+			self.assertRaises(ValueError, sg.configure, dict(BASE_CONFIG, **bad))
+
+	def test_pack_positions_stay_inside(self):
+
+		self.assertEqual(slopegraph.packPositions([ 0, 0.5, 1, 1.2 ], 1, 0, 3), [ 0, 1, 2, 3 ])
+		self.assertEqual(slopegraph.packPositions([ -1, 0 ], 1, 0, 3), [ 0, 1 ])